@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        from greenleaf.image_derivatives import register
+        from .models import UserProfile
+
+        # Thumbnail/medium WebP copies for list views
+        register(UserProfile, 'profile_image')
@@ -2,12 +2,15 @@
 
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from greenleaf.image_derivatives import DerivativeURLField
 from .models import UserProfile
 
 class UserProfileSerializer(serializers.ModelSerializer):
+    profile_image_thumbnail = DerivativeURLField('thumbnail', source='profile_image')
+
     class Meta:
         model = UserProfile
-        fields = ('bio', 'profile_image')
+        fields = ('bio', 'profile_image', 'profile_image_thumbnail')
 
 class UserSerializer(serializers.ModelSerializer):
     profile = UserProfileSerializer(required=False)
@@ -0,0 +1,44 @@
+# authentication/tokens.py
+
+from django.contrib.auth.models import User
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+_jwt_authentication = JWTAuthentication()
+
+
+async def aget_user_for_token(raw_token):
+    """
+    Resolve an access token to an active user without blocking the event loop, for async
+    views and websocket consumers that run outside DRF. Returns None if the token is
+    missing, invalid or expired.
+    """
+    if not raw_token:
+        return None
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode()
+    try:
+        validated_token = _jwt_authentication.get_validated_token(raw_token)
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, TokenError, KeyError):
+        return None
+
+    try:
+        user = await User.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+    except User.DoesNotExist:
+        return None
+    return user if user.is_active else None
+
+
+async def aget_user_for_request(request):
+    """aget_user_for_token() for the `Authorization: Bearer <token>` header of a Django request"""
+    header = _jwt_authentication.get_header(request)
+    if header is None:
+        return None
+    try:
+        raw_token = _jwt_authentication.get_raw_token(header)
+    except AuthenticationFailed:
+        return None
+    return await aget_user_for_token(raw_token)
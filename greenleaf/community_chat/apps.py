@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CommunityChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'community_chat'
+
+    def ready(self):
+        from greenleaf.image_derivatives import register
+        from greenleaf.storage import release_on_delete
+        from .models import ChatMessage
+
+        # Before register(): its delete handler checks whether the file is still referenced
+        release_on_delete(ChatMessage, 'image')
+        # Thumbnail/medium WebP copies for list views
+        register(ChatMessage, 'image')
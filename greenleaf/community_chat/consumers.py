@@ -1,60 +1,90 @@
 # community_chat/consumers.py
 import json
+from urllib.parse import parse_qs, unquote, urlparse
+
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
+from django.conf import settings
+from django.utils import timezone
+
+from authentication.tokens import aget_user_for_token
+from greenleaf.storage import is_cas_name
+from .message_buffer import message_buffer
 from .models import ChatRoom, ChatMessage
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    One chat room over a websocket. The sender is the connection's user (session, or
+    `?token=<access token>`) and the room is looked up once at connect, so messages
+    need no queries: they are broadcast immediately and stored in bulk by the
+    write-behind buffer.
+    """
+
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
-        
+
+        self.user = self.scope.get('user')
+        if self.user is None or not self.user.is_authenticated:
+            params = parse_qs(self.scope.get('query_string', b'').decode())
+            self.user = await aget_user_for_token(params.get('token', [None])[0])
+        self.room = await ChatRoom.objects.filter(name=self.room_name).afirst()
+        if self.user is None or self.room is None:
+            # Closing before accept() rejects the handshake
+            await self.close()
+            return
+
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
-        
+
         await self.accept()
-    
+
     async def disconnect(self, close_code):
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
-    
+
     # Receive message from WebSocket
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
         message_type = text_data_json.get('type', 'message')
-        
+
         if message_type == 'message':
             message = text_data_json['message']
-            username = text_data_json['username']
             image_url = text_data_json.get('image_url', None)
-            
-            # Store message in database
-            await self.save_message(username, message, image_url)
-            
+            created_at = timezone.now()
+
+            # Stored by the write-behind buffer; the room doesn't wait for the database
+            message_buffer.add(ChatMessage(
+                room=self.room,
+                user=self.user,
+                content=message,
+                image=self._image_name(image_url),
+                created_at=created_at,
+            ))
+
             # Send message to room group
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'chat_message',
                     'message': message,
-                    'username': username,
-                    'image_url': image_url
+                    'username': self.user.username,
+                    'image_url': image_url,
+                    'created_at': created_at.isoformat(),
                 }
             )
-    
+
     # Receive message from room group
     async def chat_message(self, event):
         message = event['message']
         username = event['username']
-        image_url = event.get['image_url']
-        
+        image_url = event.get('image_url')
+
         # Send message to WebSocket
         await self.send(text_data=json.dumps({
             'type': 'chat_message',
@@ -63,27 +93,23 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'image_url': image_url,
             'created_at': event.get('created_at', None) or self._get_timestamp()
         }))
-    
+
     @staticmethod
     def _get_timestamp():
         from datetime import datetime
         return datetime.now().isoformat()
-    
-    @database_sync_to_async
-    def save_message(self, username, message, image_url=None):
-        user = User.objects.get(username=username)
-        room = ChatRoom.objects.get(name=self.room_name)
-        
-        chat_message = ChatMessage.objects.create(
-            room=room,
-            user=user,
-            content=message
-        )
-        
-        if image_url:
-            # Note: This is a simplified version. In production, you'd handle the image differently
-            # This is just saving the URL, not the actual image
-            chat_message.image = image_url
-            chat_message.save()
-        
-        return chat_message
\ No newline at end of file
+
+    @staticmethod
+    def _image_name(image_url):
+        """
+        Storage name of a content-addressed image previously uploaded to this server, or
+        None. The URL comes from the client, so anything else (other media files, `..`)
+        is not attached to the message.
+        """
+        if not image_url or not isinstance(image_url, str):
+            return None
+        path = unquote(urlparse(image_url).path)
+        if not path.startswith(settings.MEDIA_URL):
+            return None
+        name = path[len(settings.MEDIA_URL):]
+        return name if is_cas_name(name) else None
@@ -0,0 +1,158 @@
+# community_chat/message_buffer.py
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriteBuffer:
+    """
+    Per-process write-behind buffer for websocket chat messages.
+
+    Consumers broadcast a message right away and hand it to add(), which only appends
+    to a list. A background thread writes the buffered messages with one bulk_create
+    every CHAT_WRITE_BUFFER_INTERVAL_MS, or as soon as CHAT_WRITE_BUFFER_SIZE are
+    waiting, so a busy room costs one insert per batch instead of several queries per
+    message. If the batch breaks a constraint (e.g. a room was deleted meanwhile), its
+    messages are stored one at a time and only the offending ones are dropped; other
+    failures are retried with the next flush, up to `max_attempts` times.
+    """
+
+    def __init__(self, max_size=None, interval_ms=None, max_attempts=3):
+        self.max_size = max(1, max_size or getattr(settings, 'CHAT_WRITE_BUFFER_SIZE', 100))
+        if interval_ms is None:
+            interval_ms = getattr(settings, 'CHAT_WRITE_BUFFER_INTERVAL_MS', 500)
+        self.interval = interval_ms / 1000
+        self.max_attempts = max_attempts
+        self._pending = []  # (message, attempts)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.flushes = 0
+        self.dropped = 0
+
+    def add(self, message):
+        """Queue an unsaved ChatMessage; never blocks on the database"""
+        with self._lock:
+            self._pending.append((message, 0))
+            full = len(self._pending) >= self.max_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+                self._thread.start()
+                # Don't lose what is still buffered when the process exits normally
+                atexit.register(self.flush)
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    @staticmethod
+    def _retain_images(messages):
+        """
+        Messages may point at an image another message already stored; content-addressed
+        files need a reference of their own, or the first delete would remove them
+        """
+        retained = []
+        for message in messages:
+            if not message.image:
+                continue
+            storage = message.image.storage
+            if hasattr(storage, 'retain'):
+                if storage.retain(message.image.name):
+                    retained.append(message)
+                else:
+                    message.image = None
+            elif not storage.exists(message.image.name):
+                message.image = None
+        return retained
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of messages stored"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            messages = [message for message, _ in batch]
+            retained = self._retain_images(messages)
+            try:
+                with transaction.atomic():
+                    ChatMessage.objects.bulk_create(messages)
+                stored = len(messages)
+            except IntegrityError as e:
+                logger.warning("Could not store %d chat messages together (%s), storing them one by one",
+                               len(messages), e)
+                stored = self._store_each(batch, retained)
+            except Exception:
+                logger.exception("Could not store %d chat messages", len(messages))
+                self._requeue(batch, retained)
+                return 0
+
+            self.written += stored
+            self.flushes += 1
+            return stored
+
+    def _store_each(self, batch, retained):
+        """Insert messages one at a time, dropping those that break a constraint"""
+        stored = 0
+        for position, (message, _) in enumerate(batch):
+            try:
+                with transaction.atomic():
+                    ChatMessage.objects.bulk_create([message])
+            except IntegrityError as e:
+                logger.warning("Dropping chat message for room %s from user %s: %s",
+                               message.room_id, message.user_id, e)
+                self.dropped += 1
+                if any(message is m for m in retained):
+                    message.image.storage.delete(message.image.name)
+                continue
+            except Exception:
+                logger.exception("Could not store %d chat messages", len(batch) - position)
+                rest = batch[position:]
+                self._requeue(rest, [m for m in retained if any(m is message for message, _ in rest)])
+                return stored
+            stored += 1
+        return stored
+
+    def _requeue(self, batch, retained):
+        """Put a failed batch back for the next flush, dropping messages out of attempts"""
+        for message in retained:
+            # Retained again on the next attempt
+            message.image.storage.delete(message.image.name)
+        retry = [(message, attempts + 1) for message, attempts in batch if attempts + 1 < self.max_attempts]
+        if len(retry) < len(batch):
+            logger.error("Dropping %d chat messages after %d failed attempts", len(batch) - len(retry),
+                         self.max_attempts)
+        self.dropped += len(batch) - len(retry)
+        with self._lock:
+            # Ahead of newer messages, to keep their order
+            self._pending[:0] = retry
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'written': self.written,
+            'flushes': self.flushes,
+            'dropped': self.dropped,
+        }
+
+
+message_buffer = MessageWriteBuffer()
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:35
+
+import greenleaf.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community_chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=greenleaf.storage.ContentAddressedStorage(), upload_to='chat_attachments/'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community_chat', '0002_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='chatroom',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-17 08:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community_chat', '0004_chat_message_room_created_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='chatmessage',
+            options={'ordering': ['created_at', 'id']},
+        ),
+    ]
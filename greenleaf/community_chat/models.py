@@ -1,9 +1,12 @@
 # community_chat/models.py
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
+from greenleaf.storage import content_addressed_storage
 
 class ChatRoom(models.Model):
-    name = models.CharField(max_length=255)
+    # Websocket connections look rooms up by name
+    name = models.CharField(max_length=255, db_index=True)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -14,11 +17,17 @@ class ChatMessage(models.Model):
     room = models.ForeignKey(ChatRoom, related_name='messages', on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name='chat_messages', on_delete=models.CASCADE)
     content = models.TextField()
-    image = models.ImageField(upload_to='chat_attachments/', blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    image = models.ImageField(upload_to='chat_attachments/', storage=content_addressed_storage,
+                              blank=True, null=True)
+    # Set when the message is sent; websocket messages are stored a moment later in bulk
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
-        ordering = ['created_at']
+        ordering = ['created_at', 'id']
+        indexes = [
+            # Room history, paged by (created_at, id)
+            models.Index(fields=['room', 'created_at', 'id'], name='chat_message_room_created_idx'),
+        ]
     
     def __str__(self):
         return f'{self.user.username}: {self.content[:20]}'
\ No newline at end of file
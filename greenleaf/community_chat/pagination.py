@@ -0,0 +1,14 @@
+# community_chat/pagination.py
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class ChatMessagePagination(CursorPagination):
+    """
+    Keyset pagination over a room's messages, newest first; follow `next` to page back
+    through older history. Backed by the (room, created_at, id) index.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = getattr(settings, 'CHAT_MESSAGES_PAGE_SIZE', 50)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'CHAT_MESSAGES_MAX_PAGE_SIZE', 200)
@@ -1,6 +1,8 @@
 # community_chat/serializers.py
+from django.conf import settings
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from greenleaf.image_derivatives import DerivativeURLField
 from .models import ChatRoom, ChatMessage
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,11 +13,13 @@ class UserSerializer(serializers.ModelSerializer):
 class ChatMessageSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     image = serializers.ImageField(read_only=True, use_url=True)
+    image_thumbnail = DerivativeURLField('thumbnail', source='image')
+    image_medium = DerivativeURLField('medium', source='image')
 
     
     class Meta:
         model = ChatMessage
-        fields = ['id', 'room', 'user', 'content', 'image', 'created_at']
+        fields = ['id', 'room', 'user', 'content', 'image', 'image_thumbnail', 'image_medium', 'created_at']
         read_only_fields = ['id', 'created_at']
 
 class ChatRoomSerializer(serializers.ModelSerializer):
@@ -24,4 +28,33 @@ class ChatRoomSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatRoom
         fields = ['id', 'name', 'description', 'created_at', 'messages']
-        read_only_fields = ['id', 'created_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at']
+
+class ChatMessagePreviewSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True)
+    content = serializers.SerializerMethodField()
+    has_image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChatMessage
+        fields = ['id', 'username', 'content', 'has_image', 'created_at']
+
+    def get_content(self, message):
+        length = getattr(settings, 'CHAT_PREVIEW_LENGTH', 100)
+        return message.content if len(message.content) <= length else message.content[:length] + '…'
+
+    def get_has_image(self, message):
+        return bool(message.image)
+
+class ChatRoomListSerializer(serializers.ModelSerializer):
+    """Room metadata with its message count and a preview of the latest message"""
+    message_count = serializers.IntegerField(read_only=True)
+    last_message = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChatRoom
+        fields = ['id', 'name', 'description', 'created_at', 'message_count', 'last_message']
+
+    def get_last_message(self, room):
+        latest = getattr(room, 'latest_messages', None)
+        return ChatMessagePreviewSerializer(latest[0], context=self.context).data if latest else None
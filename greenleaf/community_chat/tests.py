@@ -1,3 +1,23 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from community_chat.consumers import ChatConsumer
+
+
+class ChatImageNameTests(SimpleTestCase):
+    digest = 'ab' * 32
+
+    def test_uploaded_image(self):
+        name = f'cas/ab/ab/{self.digest}.jpg'
+        self.assertEqual(ChatConsumer._image_name(f'http://testserver/media/{name}'), name)
+        self.assertEqual(ChatConsumer._image_name(f'/media/{name}'), name)
+
+    def test_other_urls_are_dropped(self):
+        for url in (
+            None, '', 42,
+            'http://testserver/media/cas/../prediction_images/legacy.jpg',
+            'http://testserver/media/cas/%2e%2e/prediction_images/legacy.jpg',
+            f'http://testserver/media/cas/ab/ab/{self.digest}.jpg/../../../../x.jpg',
+            'http://testserver/media/prediction_images/legacy.jpg',
+            f'http://testserver/static/cas/ab/ab/{self.digest}.jpg',
+        ):
+            self.assertIsNone(ChatConsumer._image_name(url), url)
@@ -1,5 +1,4 @@
 import uuid
-from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 
 def handle_chat_image_upload(room_id: int, user, image_file):
@@ -13,7 +12,9 @@ def handle_chat_image_upload(room_id: int, user, image_file):
     ext = image_file.name.split('.')[-1]
     filename = f"chat_attachments/{room.id}/{uuid.uuid4().hex}.{ext}"
 
-    path = default_storage.save(filename, ContentFile(image_file.read()))
+    # Content-addressed storage: reposting the same photo in another room reuses the stored file
+    storage = ChatMessage._meta.get_field('image').storage
+    path = storage.save(filename, ContentFile(image_file.read()))
 
     message = ChatMessage.objects.create(
         room=room,
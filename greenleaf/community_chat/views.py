@@ -2,27 +2,50 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.db.models import Count, Prefetch
 from django.shortcuts import get_object_or_404
 
 from .models import ChatRoom, ChatMessage
-from .serializers import ChatRoomSerializer, ChatMessageSerializer
+from .pagination import ChatMessagePagination
+from .serializers import ChatRoomSerializer, ChatRoomListSerializer, ChatMessageSerializer
 from .utils import handle_chat_image_upload  # make sure this exists!
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
 class ChatRoomViewSet(viewsets.ModelViewSet):
+    """
+    Rooms are listed and retrieved without their messages: just a message count and a
+    preview of the latest one. History is paged through `rooms/<id>/messages/`.
+    """
     queryset = ChatRoom.objects.all()
     serializer_class = ChatRoomSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            latest = ChatMessage.objects.select_related('user').order_by('-created_at', '-id')[:1]
+            queryset = queryset.annotate(message_count=Count('messages')).prefetch_related(
+                Prefetch('messages', queryset=latest, to_attr='latest_messages')
+            )
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve'):
+            return ChatRoomListSerializer
+        return super().get_serializer_class()
+
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
+        """The room's messages, newest first, cursor-paginated"""
         room = self.get_object()
-        messages = room.messages.all().order_by('-created_at')[:100]
-        serializer = ChatMessageSerializer(messages, many=True, context={'request': request})
-        return Response(serializer.data)
+        messages = ChatMessage.objects.filter(room=room).select_related('user')
+        paginator = ChatMessagePagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
+        serializer = ChatMessageSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
 class ChatMessageViewSet(viewsets.ModelViewSet):
-    queryset = ChatMessage.objects.all()
+    queryset = ChatMessage.objects.select_related('user')
     serializer_class = ChatMessageSerializer
     parser_classes = [MultiPartParser, FormParser]
 
@@ -71,5 +94,5 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
             }
         )
 
-        serializer = ChatMessageSerializer(message, many=True, context={'request': request})
+        serializer = ChatMessageSerializer(message, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
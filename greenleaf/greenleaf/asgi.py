@@ -13,6 +13,7 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from channels.security.websocket import AllowedHostsOriginValidator
 import community_chat.routing
+import prediction.routing
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
@@ -20,6 +21,7 @@ application = ProtocolTypeRouter({
         AuthMiddlewareStack(
             URLRouter(
                 community_chat.routing.websocket_urlpatterns
+                + prediction.routing.websocket_urlpatterns
             )
         )
     ),
@@ -0,0 +1,165 @@
+# greenleaf/image_derivatives.py
+"""
+Compact WebP derivatives (thumbnail, medium) of uploaded photos.
+
+Derivatives live at a path derived from the original file name, e.g.
+prediction_images/leaf.jpg -> derivatives/prediction_images/leaf_thumbnail.webp,
+so no extra columns are needed. They are always written to default_storage, whatever
+storage the original uses. They are generated on a background thread after the row
+is committed, never on the request path. Serializers return their URLs without
+checking the storage, so until then a derivative URL answers 404 and clients fall
+back to the original.
+"""
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from .storage import ContentAddressedStorage
+
+DERIVATIVES_DIR = 'derivatives'
+
+# (model, field name) pairs passed to register(), for the backfill command
+REGISTERED_FIELDS = []
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def derivative_sizes():
+    """{kind: longest side in px}, largest first so each one is resized from the previous"""
+    sizes = getattr(settings, 'IMAGE_DERIVATIVES', {'medium': 1024, 'thumbnail': 256})
+    return dict(sorted(sizes.items(), key=lambda item: -item[1]))
+
+
+def derivative_name(name, kind):
+    root, _ = os.path.splitext(name)
+    return f'{DERIVATIVES_DIR}/{root}_{kind}.webp'
+
+
+def generate_derivatives(name, storage=None, overwrite=False):
+    """Write every missing derivative of an image in `storage`; returns the number written"""
+    storage = storage or default_storage
+    sizes = derivative_sizes()
+    pending = {
+        kind: size for kind, size in sizes.items()
+        if overwrite or not default_storage.exists(derivative_name(name, kind))
+    }
+    if not pending:
+        return 0
+
+    quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+    with storage.open(name, 'rb') as f:
+        img = Image.open(f)
+        # Let the JPEG decoder downscale while decoding; the largest derivative is the floor
+        largest = max(pending.values())
+        img.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGB')
+
+        written = 0
+        for kind, size in pending.items():
+            img.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+            buffer = io.BytesIO()
+            img.save(buffer, format='WEBP', quality=quality, method=4)
+            path = derivative_name(name, kind)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            saved = default_storage.save(path, ContentFile(buffer.getvalue()))
+            if saved != path:
+                # Another worker wrote the same derivative meanwhile (e.g. a shared
+                # content-addressed original); keep theirs
+                default_storage.delete(saved)
+            written += 1
+    return written
+
+
+def delete_derivatives(name):
+    for kind in derivative_sizes():
+        path = derivative_name(name, kind)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+                    thread_name_prefix='image-derivatives',
+                )
+    return _executor
+
+
+def _generate_logged(name, storage):
+    try:
+        generate_derivatives(name, storage)
+    except Exception as e:
+        print(f"Could not generate derivatives for {name}: {e}")
+
+
+def schedule_derivatives(field_file):
+    """Generate derivatives in the background once the current transaction commits"""
+    if not field_file:
+        return
+    name, storage = field_file.name, field_file.storage
+    transaction.on_commit(lambda: _get_executor().submit(_generate_logged, name, storage))
+
+
+def register(model, field_name):
+    """Keep derivatives of `model.<field_name>` in step with saves and deletes"""
+    REGISTERED_FIELDS.append((model, field_name))
+
+    def on_save(sender, instance, raw=False, **kwargs):
+        if not raw:
+            schedule_derivatives(getattr(instance, field_name))
+
+    def on_delete(sender, instance, **kwargs):
+        field_file = getattr(instance, field_name)
+        if not field_file:
+            return
+        name, storage = field_file.name, field_file.storage
+
+        def cleanup():
+            # Content-addressed originals may still be referenced by other rows
+            if not isinstance(storage, ContentAddressedStorage) or not storage.exists(name):
+                delete_derivatives(name)
+        transaction.on_commit(cleanup)
+
+    post_save.connect(on_save, sender=model, weak=False,
+                      dispatch_uid=f'derivatives_save_{model._meta.label}_{field_name}')
+    post_delete.connect(on_delete, sender=model, weak=False,
+                        dispatch_uid=f'derivatives_delete_{model._meta.label}_{field_name}')
+
+
+class DerivativeURLField(serializers.Field):
+    """
+    Read-only URL of one derivative of an ImageField, absolute when the serializer has a
+    request in its context; null when there is no image. The storage isn't probed per
+    row, so the URL 404s until the derivative has been generated.
+
+        image_thumbnail = DerivativeURLField('thumbnail', source='image')
+    """
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = default_storage.url(derivative_name(value.name, self.kind))
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
@@ -68,6 +68,23 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CHAT_ATTACHMENT_ROOT = os.path.join(MEDIA_ROOT, 'chat_attachments')
 
+# Websocket chat messages are broadcast at once and stored in bulk by a background thread,
+# whenever this many are waiting or every N ms
+CHAT_WRITE_BUFFER_SIZE = 100
+CHAT_WRITE_BUFFER_INTERVAL_MS = 500
+
+# rooms/<id>/messages/: messages per cursor page by default, the most a client may ask for,
+# and the characters of the latest message shown in the room list
+CHAT_MESSAGES_PAGE_SIZE = 50
+CHAT_MESSAGES_MAX_PAGE_SIZE = 200
+CHAT_PREVIEW_LENGTH = 100
+
+# WebP copies of uploaded photos (longest side in px), written to MEDIA_ROOT/derivatives/
+# by a background thread after upload; backfill with `manage.py generate_image_derivatives`
+IMAGE_DERIVATIVES = {'medium': 1024, 'thumbnail': 256}
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_DERIVATIVE_WORKERS = 2
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -103,6 +120,81 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 UPLOAD_DIR = os.path.join(MEDIA_ROOT, 'uploads')
 MODEL_DIR = os.path.join(BASE_DIR, 'prediction', 'ml_model')
 
+# Inference batching: concurrent /predict/ calls are grouped into one interpreter invoke
+PREDICTION_MAX_BATCH_SIZE = 8
+PREDICTION_MAX_BATCH_WAIT_MS = 5
+
+# Interpreter pool: each interpreter serves one batch at a time; num_threads=None lets TFLite decide
+PREDICTION_INTERPRETER_POOL_SIZE = 2
+PREDICTION_INTERPRETER_THREADS = None
+
+# Hot reload: poll the tflite/metadata files every N seconds and swap in new versions (0 = off,
+# reload only through /api/data/model-reload/)
+PREDICTION_MODEL_WATCH_INTERVAL = 10
+
+# Result cache for resubmitted photos, keyed by image hash + model file identity
+PREDICTION_CACHE_MAX_ENTRIES = 1024
+PREDICTION_CACHE_TTL_SECONDS = 60 * 60
+
+# /predict/batch/: decoded images kept in flight per request, and the largest zip member accepted
+PREDICTION_BATCH_WINDOW = 16
+PREDICTION_BATCH_MAX_MEMBER_BYTES = 25 * 1024 * 1024
+
+# Decode/resize in this many worker processes via shared memory; 0 decodes in the request thread
+PREDICTION_PREPROCESS_WORKERS = 0
+# Seconds to wait for a free shared memory block before failing the image instead of hanging
+PREDICTION_PREPROCESS_SLOT_TIMEOUT = 30
+
+# Model registry: versioned tflite/metadata pairs in MODEL_DIR/registry/<version>/.
+# PREDICTION_MODEL_TRAFFIC sends a percentage of /predict/ to each version (e.g. {'v2': 10});
+# the rest is served by the default model. Shadow models score the same images in the
+# background for comparison only.
+PREDICTION_MODEL_REGISTRY_DIR = os.path.join(MODEL_DIR, 'registry')
+PREDICTION_MODEL_TRAFFIC = {}
+PREDICTION_SHADOW_MODELS = []
+PREDICTION_SHADOW_QUEUE_SIZE = 64
+
+# Model releases for mobile clients (manage.py publish_model_release): each published model
+# and the binary patches between releases, served by /api/data/model-releases/
+PREDICTION_MODEL_RELEASES_DIR = os.path.join(MODEL_DIR, 'releases')
+
+# /predict/async/: threads reserved for upload parsing and decode, and how many more
+# requests may queue for them before the view answers 503
+PREDICTION_ASYNC_WORKERS = 4
+PREDICTION_ASYNC_MAX_PENDING = 64
+
+# ws/predict/: largest binary frame accepted
+PREDICTION_WS_MAX_FRAME_BYTES = 5 * 1024 * 1024
+
+# predictions/sync_offline/: records accepted per request, and parallel image writes
+PREDICTION_SYNC_MAX_ITEMS = 500
+PREDICTION_SYNC_WRITE_WORKERS = 4
+
+# predictions/ history: rows per cursor page by default, and the most a client may ask for
+PREDICTION_HISTORY_PAGE_SIZE = 50
+PREDICTION_HISTORY_MAX_PAGE_SIZE = 200
+
+# Disease details for /predict/ are kept in memory per worker. Changes are announced through a
+# version stamp in this cache, which every worker process must share (a system check refuses
+# process-local backends)
+PREDICTION_CATALOG_CACHE = 'disease_catalog'
+PREDICTION_CATALOG_CHECK_SECONDS = 1
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # 'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        # 'LOCATION': 'redis://127.0.0.1:6379',
+    },
+    # Shared by the worker processes on this host; use Redis when they run on several hosts
+    'disease_catalog': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'disease_catalog'),
+        # 'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        # 'LOCATION': 'redis://127.0.0.1:6379',
+    },
+}
+
 # CORS Settings
 CORS_ALLOW_ALL_ORIGINS = True
 
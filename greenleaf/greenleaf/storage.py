@@ -0,0 +1,176 @@
+# greenleaf/storage.py
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files import locks
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.utils.deconstruct import deconstructible
+
+CAS_DIR = 'cas'
+# cas/ab/cd/abcd...ef.jpg; the extension is optional
+_CAS_NAME = re.compile(r'cas/([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})(\.[a-z0-9]{1,10})?')
+
+
+def is_cas_name(name):
+    """Whether `name` is exactly a content-addressed file name, with no `..` or other detours"""
+    if not isinstance(name, str) or posixpath.normpath(name) != name:
+        return False
+    return _CAS_NAME.fullmatch(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names files by the SHA-256 of their content, so identical
+    uploads (retried offline syncs, photos reposted across chat rooms) are written
+    and stored once: cas/ab/cd/abcd...ef.jpg under MEDIA_ROOT.
+
+    Every save() takes a reference and every delete() releases one; the file is only
+    removed with its last reference. Counts live in a `.refs` sidecar next to the
+    file and are updated under a file lock, so several worker processes can share
+    MEDIA_ROOT. Other names (files stored before this backend, or anything that
+    isn't exactly cas/xx/yy/<sha256>.<ext>) are served normally but never deleted
+    or retained.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save(); nothing to probe for here
+        return name
+
+    def _hash_to_temp(self, content):
+        """Stream the content into a temp file under cas/ while hashing it"""
+        tmp_dir = self.path(os.path.join(CAS_DIR, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest.hexdigest(), tmp_path
+
+    @staticmethod
+    def content_name(digest, original_name):
+        ext = os.path.splitext(original_name)[1].lower()
+        if not re.fullmatch(r'\.[a-z0-9]{1,10}', ext):
+            # Keep names inside the shape is_cas_name() accepts
+            ext = ''
+        return f'{CAS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def _update_refs(self, name, delta, tmp_path=None):
+        """Add `delta` to the reference count of `name` under its lock; returns the new count"""
+        full_path = self.path(name)
+        refs_path = full_path + '.refs'
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        try:
+            while True:
+                with open(refs_path, 'a+') as f:
+                    locks.lock(f, locks.LOCK_EX)
+                    try:
+                        # A concurrent release may have unlinked the sidecar while we waited
+                        # for its lock; start over on the current file in that case
+                        try:
+                            if os.stat(refs_path).st_ino != os.fstat(f.fileno()).st_ino:
+                                continue
+                        except FileNotFoundError:
+                            continue
+
+                        f.seek(0)
+                        count = int(f.read().strip() or 0)
+
+                        if delta > 0 and not os.path.exists(full_path):
+                            if tmp_path is None:
+                                # Nothing to add a reference to; don't leave an empty sidecar
+                                if not count:
+                                    os.remove(refs_path)
+                                raise FileNotFoundError(name)
+                            os.replace(tmp_path, full_path)
+                            tmp_path = None
+                            if self.file_permissions_mode is not None:
+                                os.chmod(full_path, self.file_permissions_mode)
+                            count = 0
+
+                        count = max(0, count + delta)
+                        if count == 0:
+                            for path in (full_path, refs_path):
+                                try:
+                                    os.remove(path)
+                                except FileNotFoundError:
+                                    pass
+                        else:
+                            f.seek(0)
+                            f.truncate()
+                            f.write(str(count))
+                            f.flush()
+                        return count
+                    finally:
+                        locks.unlock(f)
+        finally:
+            # Identical content was already stored, or the update failed
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def _save(self, name, content):
+        digest, tmp_path = self._hash_to_temp(content)
+        name = self.content_name(digest, name)
+        self._update_refs(name, 1, tmp_path=tmp_path)
+        return name
+
+    def delete(self, name):
+        """Release one reference; the file goes away with the last one"""
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        if not is_cas_name(name):
+            return
+        self._update_refs(name, -1)
+
+    def retain(self, name):
+        """Take another reference to a stored file, for a row reusing another row's file"""
+        if not is_cas_name(name) or not self.exists(name):
+            return False
+        try:
+            self._update_refs(name, 1)
+        except FileNotFoundError:
+            # Its last reference went away meanwhile
+            return False
+        return True
+
+    def references(self, name):
+        try:
+            with open(self.path(name) + '.refs') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def release_on_delete(model, field_name):
+    """
+    Release the file reference of `model.<field_name>` once a row delete commits.
+    Connect before other post_delete handlers that check whether the file still exists.
+    """
+
+    def on_delete(sender, instance, **kwargs):
+        field_file = getattr(instance, field_name)
+        if field_file and isinstance(field_file.storage, ContentAddressedStorage):
+            name, storage = field_file.name, field_file.storage
+            transaction.on_commit(lambda: storage.delete(name))
+
+    post_delete.connect(on_delete, sender=model, weak=False,
+                        dispatch_uid=f'cas_release_{model._meta.label}_{field_name}')
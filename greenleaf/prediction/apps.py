@@ -4,3 +4,23 @@ from django.apps import AppConfig
 class PredictionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'prediction'
+
+    def ready(self):
+        from greenleaf.image_derivatives import register
+        from greenleaf.storage import release_on_delete
+        from . import rollups
+        from .catalog import disease_catalog
+        from .ml_utils import plant_disease_model
+        from .models import Prediction
+
+        # Disease details are served from memory; preloaded with each model version
+        disease_catalog.connect()
+        plant_disease_model.on_reload(disease_catalog.preload)
+
+        # Disease counts behind diseases/common/ and diseases/trending/
+        rollups.connect()
+
+        # Before register(): its delete handler checks whether the file is still referenced
+        release_on_delete(Prediction, 'image')
+        # Thumbnail/medium WebP copies for list views
+        register(Prediction, 'image')
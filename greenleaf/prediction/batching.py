@@ -0,0 +1,172 @@
+# prediction/batching.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .ml_utils import plant_disease_model
+from .metrics import stage_seconds
+
+# Queued once per dispatcher thread by close()
+_STOP = object()
+# How often a dispatcher holding a batch open checks whether an interpreter slot is free
+_SLOT_POLL = 0.0005
+
+
+class _PendingPrediction:
+    """A single caller waiting for its slice of a batched invoke"""
+    __slots__ = ('pixels', 'top_k', 'future', 'enqueued_at')
+
+    def __init__(self, pixels, top_k):
+        self.pixels = pixels
+        self.top_k = top_k
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class PredictionBatcher:
+    """
+    Collects concurrent prediction requests and runs them through the model as one batch.
+
+    A dispatcher takes everything already queued and runs it right away when an
+    interpreter slot is free, so a lone request never waits for company. Only while
+    every slot is busy does it hold the batch open for stragglers, until it reaches
+    `max_batch_size`, the oldest request has waited `max_wait_ms` or a slot frees up.
+    One dispatcher thread runs per pooled interpreter, so several batches can be in
+    `invoke()` at the same time; slots are capped at the CPU count, since more
+    parallel invokes than cores only slow each other down.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait_ms=5, workers=None):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._threads = []
+        self._threads_lock = threading.Lock()
+        self._slots = 1
+        self._running = 0  # batches inside invoke()
+        self._running_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        """Start the dispatcher threads on first use"""
+        if self._threads:
+            return
+        with self._threads_lock:
+            if self._threads:
+                return
+            workers = max(1, int(self.workers or self.model.pool_size))
+            self._slots = min(workers, os.cpu_count() or 1)
+            for i in range(workers):
+                thread = threading.Thread(
+                    target=self._run, name=f'prediction-batcher-{i}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, pixels, top_k=3):
+        """Queue a preprocessed image and return a Future resolving to its top-k predictions"""
+        pending = _PendingPrediction(pixels, top_k)
+        self._ensure_worker()
+        self._queue.put(pending)
+        return pending.future
+
+    def predict(self, pixels, top_k=3, timeout=None):
+        """Blocking helper: submit one image and wait for its predictions"""
+        return self.submit(pixels, top_k=top_k).result(timeout=timeout)
+
+    def close(self):
+        """Stop the dispatcher threads once the requests already queued have been served"""
+        with self._threads_lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+    def _take(self, timeout=None):
+        """Next queued request, None on close(); raises queue.Empty if none arrives in time"""
+        pending = self._queue.get(block=timeout is None or timeout > 0, timeout=timeout or None)
+        if pending is _STOP:
+            # Leave it for this thread's next _collect() so the batch still runs
+            self._queue.put(pending)
+            return None
+        return pending
+
+    def _collect(self):
+        """First request plus what is queued; held open for more only while every slot is busy"""
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+
+        # Whatever is already queued goes along without waiting
+        try:
+            while len(batch) < self.max_batch_size:
+                pending = self._take(timeout=0)
+                if pending is None:
+                    return batch
+                batch.append(pending)
+        except queue.Empty:
+            pass
+
+        # With a free slot, waiting only adds latency
+        if self._running < self._slots:
+            return batch
+
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._running < self._slots:
+                break
+            try:
+                # Short waits, to notice a slot freeing up
+                pending = self._take(timeout=min(remaining, _SLOT_POLL))
+            except queue.Empty:
+                continue
+            if pending is None:
+                break
+            batch.append(pending)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # Skip callers that cancelled while queued (e.g. an async client disconnected);
+            # the rest can no longer be cancelled
+            batch = [pending for pending in batch if pending.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            dispatched_at = time.monotonic()
+            for pending in batch:
+                stage_seconds.observe(dispatched_at - pending.enqueued_at, 'queue_wait')
+            with self._running_lock:
+                self._running += 1
+            try:
+                top_k = max(pending.top_k for pending in batch)
+                results = self.model.get_top_predictions_batch(
+                    [pending.pixels for pending in batch], top_k=top_k
+                )
+                for pending, result in zip(batch, results):
+                    pending.future.set_result(result[:pending.top_k])
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+            finally:
+                with self._running_lock:
+                    self._running -= 1
+
+
+# Shared batcher in front of the model singleton
+prediction_batcher = PredictionBatcher(
+    plant_disease_model,
+    max_batch_size=getattr(settings, 'PREDICTION_MAX_BATCH_SIZE', 8),
+    max_wait_ms=getattr(settings, 'PREDICTION_MAX_BATCH_WAIT_MS', 5),
+)
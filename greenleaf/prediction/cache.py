@@ -0,0 +1,173 @@
+# prediction/cache.py
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .ml_utils import plant_disease_model
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of top-k predictions keyed by image content and the active model version.
+
+    Concurrent lookups for the same key share one in-flight computation (single-flight),
+    so a burst of retried uploads of one photo runs the model once. Entries are dropped
+    as soon as a different model version (new tflite/metadata file) becomes active.
+    """
+
+    def __init__(self, model, max_entries=1024, ttl_seconds=3600):
+        self.model = model
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self._model_identity = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def image_key(image_source):
+        """SHA-256 of the image bytes; accepts bytes, file-like objects and UploadedFile"""
+        digest = hashlib.sha256()
+        if isinstance(image_source, (bytes, bytearray, memoryview)):
+            digest.update(image_source)
+        elif hasattr(image_source, 'chunks'):
+            for chunk in image_source.chunks():
+                digest.update(chunk)
+        else:
+            image_source.seek(0)
+            for chunk in iter(lambda: image_source.read(64 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _current_model_identity(self):
+        """File identity of the model version currently serving, or None if no model could load"""
+        self.model.ensure_loaded()
+        version = self.model.active
+        return version.identity if version is not None else None
+
+    def _check_model_identity(self):
+        """Clear every entry when the active model version changed; must hold the lock"""
+        identity = self._current_model_identity()
+        if identity != self._model_identity:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._model_identity = identity
+        return identity
+
+    def _claim(self, image_key, top_k):
+        """
+        Look the key up and register interest in it. Returns (key, identity, value, future,
+        owner): `value` on a fresh hit, otherwise the in-flight future, and whether the
+        caller has to compute it.
+        """
+        with self._lock:
+            identity = self._check_model_identity()
+            key = (identity, image_key, top_k)
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return key, identity, value, None, False
+                del self._entries[key]
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return key, identity, None, future, False
+
+            self.misses += 1
+            future = Future()
+            self._inflight[key] = future
+            return key, identity, None, future, True
+
+    def _fail(self, key, future, error):
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_exception(error)
+
+    def _complete(self, key, identity, future, value):
+        with self._lock:
+            self._inflight.pop(key, None)
+            # Don't cache failures, or results computed against a model that has since changed
+            if value is not None and identity is not None and identity == self._model_identity:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        future.set_result(value)
+
+    def get_or_compute(self, image_key, top_k, compute):
+        """Return cached predictions for the image, or run `compute()` once for all concurrent callers"""
+        key, identity, value, future, owner = self._claim(image_key, top_k)
+        if future is None:
+            return value
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._complete(key, identity, future, value)
+        return value
+
+    async def aget_or_compute(self, image_key, top_k, compute):
+        """get_or_compute() for async views: `compute` is a coroutine function and waiting doesn't block the loop"""
+        key, identity, value, future, owner = self._claim(image_key, top_k)
+        if future is None:
+            return value
+        if not owner:
+            # shield: a waiter that disconnects must not cancel the shared future
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._complete(key, identity, future, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters for ModelInfoView"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Shared result cache in front of the model singleton
+prediction_cache = PredictionCache(
+    plant_disease_model,
+    max_entries=getattr(settings, 'PREDICTION_CACHE_MAX_ENTRIES', 1024),
+    ttl_seconds=getattr(settings, 'PREDICTION_CACHE_TTL_SECONDS', 3600),
+)
@@ -0,0 +1,167 @@
+# prediction/catalog.py
+import logging
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from .models import PlantDisease
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'prediction:disease_catalog:version'
+
+# Backends that keep entries inside one process (or not at all), so other workers never see a new stamp
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class DiseaseCatalog:
+    """
+    Per-process copy of every PlantDisease, keyed by class_name, holding the `details`
+    block /predict/ returns ready to send, so answering a prediction needs no query.
+
+    It is loaded when a model version becomes active and reloaded when the shared
+    version stamp in the PREDICTION_CATALOG_CACHE cache changes. Saving or deleting a
+    PlantDisease bumps the stamp, so every worker sharing that cache picks up the
+    change within PREDICTION_CATALOG_CHECK_SECONDS. That cache has to be shared by all
+    worker processes; a system check refuses process-local backends.
+    """
+
+    def __init__(self, cache_alias=None, check_seconds=None):
+        self.cache_alias = cache_alias or getattr(settings, 'PREDICTION_CATALOG_CACHE', 'default')
+        if check_seconds is None:
+            check_seconds = getattr(settings, 'PREDICTION_CATALOG_CHECK_SECONDS', 1)
+        self.check_seconds = check_seconds
+        self._details = None  # class_name -> details dict
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _shared_version(self):
+        version = self.cache.get(VERSION_KEY)
+        if version is None:
+            # First worker up (or the stamp was evicted): whoever adds it first wins
+            self.cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = self.cache.get(VERSION_KEY)
+        return version
+
+    def _fresh(self):
+        """The loaded catalog if it was checked recently enough to use without looking at the stamp"""
+        details = self._details
+        if details is not None and time.monotonic() - self._checked_at < self.check_seconds:
+            return details
+        return None
+
+    def load(self, classes=None):
+        """Read the whole catalog in one query; `classes` ({index: class_name}) are checked against it"""
+        with self._lock:
+            # Read the stamp first: a change committed while we query forces another load
+            version = self._shared_version()
+            details = {
+                disease.class_name: {
+                    'description': disease.description,
+                    'symptoms': disease.symptoms,
+                    'treatment': disease.treatment,
+                    'prevention': disease.prevention,
+                }
+                for disease in PlantDisease.objects.only(
+                    'class_name', 'description', 'symptoms', 'treatment', 'prevention'
+                )
+            }
+            self._details = details
+            self._version = version
+            self._checked_at = time.monotonic()
+            self.loads += 1
+
+        logger.info("Loaded disease catalog: %d diseases", len(details))
+        if classes:
+            missing = sorted(set(classes.values()) - details.keys())
+            if missing:
+                logger.warning("No PlantDisease for model classes: %s", ', '.join(missing))
+        return details
+
+    def preload(self, version):
+        """Model reload callback: load the catalog for the newly active class map"""
+        self.load(version.classes)
+
+    def _current(self):
+        details = self._fresh()
+        if details is not None:
+            return details
+        details = self._details
+        if details is not None and self._shared_version() == self._version:
+            self._checked_at = time.monotonic()
+            return details
+        return self.load()
+
+    def get(self, class_name):
+        """The `details` block for a class, or None if it has no PlantDisease"""
+        return self._current().get(class_name)
+
+    async def aget(self, class_name):
+        details = self._fresh()
+        if details is not None:
+            return details.get(class_name)
+        # Checking the stamp or reloading may touch the cache backend and the database
+        return await sync_to_async(self.get)(class_name)
+
+    def invalidate(self):
+        """Make every worker reload the catalog on its next lookup"""
+        self.cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        self._details = None
+
+    def check_cache(self):
+        """System check errors for a catalog cache other worker processes can't see"""
+        backend = settings.CACHES.get(self.cache_alias, {}).get('BACKEND')
+        if backend is None:
+            return [checks.Error(
+                f"PREDICTION_CATALOG_CACHE names the cache '{self.cache_alias}', which is not in CACHES.",
+                id='prediction.E001',
+            )]
+        if backend in PROCESS_LOCAL_CACHES:
+            return [checks.Error(
+                f"The disease catalog cache '{self.cache_alias}' uses {backend}, which is not shared "
+                f"between processes, so disease changes would not reach the other workers.",
+                hint='Point PREDICTION_CATALOG_CACHE at a file-based, database or Redis cache.',
+                id='prediction.E002',
+            )]
+        return []
+
+    def stats(self):
+        return {
+            'diseases': len(self._details) if self._details is not None else None,
+            'version': self._version,
+            'loads': self.loads,
+        }
+
+    def connect(self):
+        """Invalidate on every PlantDisease save or delete"""
+        def on_change(sender, raw=False, **kwargs):
+            if not raw:
+                # After commit, so no worker can reload the old rows under the new stamp
+                transaction.on_commit(self.invalidate)
+
+        post_save.connect(on_change, sender=PlantDisease, weak=False, dispatch_uid='disease_catalog_save')
+        post_delete.connect(on_change, sender=PlantDisease, weak=False, dispatch_uid='disease_catalog_delete')
+
+
+disease_catalog = DiseaseCatalog()
+
+
+@checks.register(checks.Tags.caches)
+def check_catalog_cache(app_configs, **kwargs):
+    return disease_catalog.check_cache()
@@ -0,0 +1,134 @@
+# prediction/consumers.py
+import asyncio
+import json
+import logging
+import time
+import traceback
+from urllib.parse import parse_qs
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+from authentication.tokens import aget_user_for_token
+from .batching import prediction_batcher
+from .executors import inference_executor, ExecutorBusy
+from .preprocessing import image_preprocessor
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionConsumer(AsyncWebsocketConsumer):
+    """
+    Continuous prediction over one websocket, e.g. for live camera scanning.
+
+    The client authenticates once with `?token=<access token>` and then sends image
+    frames as binary messages; each answered frame gets a JSON message with its top-k
+    predictions. Only the newest unanswered frame is kept: frames that arrive while
+    one is being predicted replace the pending frame and are reported as dropped,
+    so results never lag behind the camera.
+
+    Text messages configure the stream, e.g. {"type": "config", "top_k": 5}.
+    """
+
+    async def connect(self):
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        self.user = await aget_user_for_token(params.get('token', [None])[0])
+        if self.user is None:
+            # Closing before accept() rejects the handshake
+            await self.close()
+            return
+
+        try:
+            self.top_k = max(1, min(int(params.get('top_k', [3])[0]), 10))
+        except ValueError:
+            self.top_k = 3
+        self.max_frame_bytes = getattr(settings, 'PREDICTION_WS_MAX_FRAME_BYTES', 5 * 1024 * 1024)
+        self.frame_count = 0
+        self.dropped = 0
+        self._pending = None  # (frame number, bytes) waiting for the worker
+        self._frame_ready = asyncio.Event()
+        self._worker = asyncio.create_task(self._predict_frames())
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        worker = getattr(self, '_worker', None)
+        if worker is not None:
+            worker.cancel()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            self.frame_count += 1
+            if len(bytes_data) > self.max_frame_bytes:
+                await self.send_json({'type': 'error', 'frame': self.frame_count, 'error': 'Frame too large'})
+                return
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (self.frame_count, bytes_data)
+            self._frame_ready.set()
+            return
+
+        try:
+            message = json.loads(text_data)
+        except (TypeError, ValueError):
+            message = None
+        if not isinstance(message, dict):
+            await self.send_json({'type': 'error', 'error': 'Expected binary image frames or JSON'})
+            return
+
+        if message.get('type') == 'config':
+            try:
+                self.top_k = max(1, min(int(message.get('top_k', self.top_k)), 10))
+            except (TypeError, ValueError):
+                await self.send_json({'type': 'error', 'error': 'top_k must be an integer'})
+                return
+            await self.send_json({'type': 'config', 'top_k': self.top_k})
+        else:
+            await self.send_json({'type': 'error', 'error': f"Unknown message type {message.get('type')!r}"})
+
+    async def send_json(self, content):
+        await self.send(text_data=json.dumps(content))
+
+    async def _predict_frames(self):
+        """Predict the newest pending frame until the socket closes"""
+        while True:
+            await self._frame_ready.wait()
+            self._frame_ready.clear()
+            if self._pending is None:
+                continue
+            frame, data = self._pending
+            self._pending = None
+            try:
+                result = await self._predict(frame, data)
+            except Exception as e:
+                logger.error("Websocket prediction failed: %s", traceback.format_exc())
+                result = {'type': 'error', 'frame': frame, 'error': str(e)}
+            await self.send_json(result)
+
+    async def _predict(self, frame, data):
+        started = time.perf_counter()
+        try:
+            lease = await inference_executor.run(
+                image_preprocessor.load, data, on_abandon=lambda lease: lease.release()
+            )
+        except ExecutorBusy:
+            return {'type': 'error', 'frame': frame, 'error': 'Server busy, frame skipped'}
+        if lease is None:
+            return {'type': 'error', 'frame': frame, 'error': 'Could not read image'}
+
+        future = prediction_batcher.submit(lease.pixels, top_k=self.top_k)
+        future.add_done_callback(lambda _: lease.release())
+        predictions = await asyncio.wrap_future(future)
+
+        disease_name, confidence = predictions[0]
+        return {
+            'type': 'prediction',
+            'frame': frame,
+            'disease': disease_name,
+            'confidence': round(confidence * 100, 2),
+            'other_predictions': [
+                {'disease': name, 'confidence': round(conf * 100, 2)}
+                for name, conf in predictions[1:]
+            ],
+            'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+            'dropped': self.dropped,
+        }
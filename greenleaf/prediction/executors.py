@@ -0,0 +1,82 @@
+# prediction/executors.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class ExecutorBusy(Exception):
+    """Raised when a BoundedExecutor already has its maximum number of jobs"""
+
+
+class BoundedExecutor:
+    """
+    Thread pool reserved for prediction work (upload parsing, hashing, decode), so async
+    views never push it into the sync_to_async pool that chat and other requests share.
+
+    At most `workers + max_pending` jobs are running or queued; submit() raises
+    ExecutorBusy past that, so a spike is shed with a 503 instead of growing an
+    unbounded backlog.
+    """
+
+    def __init__(self, workers=4, max_pending=64, name='inference'):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(0, int(max_pending))
+        self.name = name
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix=self.name
+                    )
+        return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise ExecutorBusy(f'{self.name} executor is at capacity')
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def run(self, fn, *args, on_abandon=None, **kwargs):
+        """
+        Await `fn(*args, **kwargs)` on the pool. If the awaiting task is cancelled while
+        the job is already running, `on_abandon(result)` receives its result once it
+        finishes, so leased resources can still be released.
+        """
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if on_abandon is not None:
+                def abandon(done):
+                    if not done.cancelled() and done.exception() is None and done.result() is not None:
+                        on_abandon(done.result())
+                future.add_done_callback(abandon)
+            raise
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected,
+        }
+
+
+# Used by the async prediction view; inference itself runs on the batcher's threads
+inference_executor = BoundedExecutor(
+    workers=getattr(settings, 'PREDICTION_ASYNC_WORKERS', 4),
+    max_pending=getattr(settings, 'PREDICTION_ASYNC_MAX_PENDING', 64),
+)
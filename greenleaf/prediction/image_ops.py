@@ -0,0 +1,79 @@
+# prediction/image_ops.py
+# Pure PIL/NumPy image decoding. Kept free of Django and TensorFlow imports so
+# preprocessing worker processes can import it cheaply.
+import io
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+
+def open_image(image_source):
+    """Open a path, raw bytes, file-like object or Django UploadedFile as a PIL image"""
+    if isinstance(image_source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(image_source))
+    if hasattr(image_source, 'read'):
+        # UploadedFile / file objects may already have been read (e.g. for hashing)
+        if hasattr(image_source, 'seek'):
+            image_source.seek(0)
+        return Image.open(image_source)
+    return Image.open(image_source)
+
+
+def decode_pixels(image_source, image_size, record=None):
+    """
+    Decode and resize an image to (image_size, image_size, 3) uint8 pixels.
+
+    `record(stage, seconds)`, if given, receives the 'decode' and 'resize' timings.
+    """
+    started = time.perf_counter()
+    img = open_image(image_source)
+    size = (image_size, image_size)
+
+    # For JPEGs, let the decoder downscale by 1/2, 1/4 or 1/8 while decoding
+    # (never below the target size), so 12-48 MP photos aren't decoded in full
+    img.draft('RGB', size)
+
+    # Convert to RGB if needed (e.g., if PNG with transparency)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    else:
+        img.load()
+    decoded = time.perf_counter()
+
+    # Resize to the expected input size; reducing_gap shrinks other large
+    # formats with a cheap box reduce before the final resample
+    img = img.resize(size, reducing_gap=3.0)
+
+    # Normalization happens when the pixels are written into the interpreter
+    pixels = np.asarray(img, dtype=np.uint8)
+
+    if record is not None:
+        record('decode', decoded - started)
+        record('resize', time.perf_counter() - decoded)
+    return pixels
+
+
+def decode_into_shared_memory(image_source, shm_name, image_size):
+    """
+    Worker-process entry point: decode an image into an existing shared memory block.
+    Returns the (stage, seconds) timings so the parent can record them.
+    """
+    timings = []
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray((image_size, image_size, 3), dtype=np.uint8, buffer=shm.buf)
+        out[...] = decode_pixels(image_source, image_size, record=lambda *timing: timings.append(timing))
+        del out
+    finally:
+        shm.close()
+    return timings
+
+
+def resize_pixels(pixels, image_size):
+    """Resize already-decoded uint8 pixels, e.g. when a reloaded model uses a new input size"""
+    if pixels.shape[0] == image_size and pixels.shape[1] == image_size:
+        return pixels
+    img = Image.fromarray(pixels).resize((image_size, image_size))
+    return np.asarray(img, dtype=np.uint8)
@@ -0,0 +1,340 @@
+# prediction/management/commands/benchmark_model.py
+import argparse
+import io
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from prediction.batching import PredictionBatcher
+from prediction.image_ops import decode_pixels
+from prediction.ml_utils import PlantDiseaseModel, file_sha256
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def int_list(value):
+    """argparse type for comma-separated integers, e.g. --threads 1,2,4"""
+    try:
+        values = [int(v) for v in value.split(',') if v.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected comma-separated integers, got {value!r}')
+    if not values or min(values) < 1:
+        raise argparse.ArgumentTypeError(f'expected positive integers, got {value!r}')
+    return values
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def config_key(result):
+    return (result['num_threads'], result['batch_size'], result['concurrency'])
+
+
+class Command(BaseCommand):
+    help = 'Benchmark inference latency and throughput across thread counts, batch sizes and concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model_path',
+            type=str,
+            default=None,
+            help='TFLite model to benchmark (default: MODEL_DIR/plant_disease_model.tflite)'
+        )
+        parser.add_argument(
+            '--metadata_path',
+            type=str,
+            default=None,
+            help='Model metadata JSON (default: MODEL_DIR/model_metadata.json)'
+        )
+        parser.add_argument(
+            '--images_dir',
+            type=str,
+            default=None,
+            help='Directory of images to use (searched recursively); synthetic images are used if omitted'
+        )
+        parser.add_argument(
+            '--num_images',
+            type=int,
+            default=64,
+            help='Number of distinct images cycled through during each run'
+        )
+        parser.add_argument(
+            '--include_decode',
+            action='store_true',
+            help='Decode and resize the image inside every request instead of once up front'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int_list,
+            default=[1],
+            help='Interpreter thread counts to sweep, comma-separated'
+        )
+        parser.add_argument(
+            '--batch_sizes',
+            type=int_list,
+            default=[1, 8],
+            help='Maximum batch sizes to sweep, comma-separated'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int_list,
+            default=[1, 8],
+            help='Numbers of concurrent clients to sweep, comma-separated'
+        )
+        parser.add_argument(
+            '--pool_size',
+            type=int,
+            default=None,
+            help='Interpreters per model (default: PREDICTION_INTERPRETER_POOL_SIZE)'
+        )
+        parser.add_argument(
+            '--max_wait_ms',
+            type=float,
+            default=getattr(settings, 'PREDICTION_MAX_BATCH_WAIT_MS', 5),
+            help='Batch collection deadline'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Timed requests per configuration'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=10,
+            help='Untimed requests per configuration before measuring'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Write the results JSON to this file (e.g. to store a baseline)'
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            default=None,
+            help='Compare against a stored results JSON and fail on regressions'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.10,
+            help='Allowed regression as a fraction of the baseline (default: 0.10 = 10%%)'
+        )
+
+    def handle(self, *args, **options):
+        model_path = options['model_path'] or os.path.join(settings.MODEL_DIR, 'plant_disease_model.tflite')
+        if not os.path.exists(model_path):
+            raise CommandError(f'Model file not found: {model_path}')
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1')
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], 'r') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        results = []
+        sources = None
+        for num_threads in options['threads']:
+            model = PlantDiseaseModel(
+                model_path=model_path,
+                metadata_path=options['metadata_path'],
+                pool_size=options['pool_size'],
+                num_threads=num_threads,
+                watch_interval=0,
+            )
+            started = time.perf_counter()
+            if not model.ensure_loaded():
+                raise CommandError(f'Model could not be loaded from {model_path}')
+            load_seconds = time.perf_counter() - started
+            model.warm_up()
+
+            if sources is None:
+                sources = self.load_sources(options, model.image_size)
+
+            for batch_size, concurrency in product(options['batch_sizes'], options['concurrency']):
+                result = self.run_config(model, sources, batch_size, concurrency, options)
+                result.update({
+                    'num_threads': num_threads,
+                    'pool_size': model.pool_size,
+                    'load_seconds': round(load_seconds, 4),
+                })
+                results.append(result)
+                latency = result['latency_ms']
+                self.stdout.write(
+                    f"threads={num_threads} batch={batch_size} concurrency={concurrency}: "
+                    f"p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms "
+                    f"{result['images_per_sec']} img/s"
+                )
+
+        report = {
+            'model': {
+                'path': model_path,
+                'sha256': file_sha256(model_path),
+                'runtime': model.pool_stats()['runtime'],
+                'input_type': model.input_type,
+                'image_size': model.image_size,
+            },
+            'images': {
+                'source': options['images_dir'] or 'synthetic',
+                'count': len(sources),
+                'include_decode': options['include_decode'],
+            },
+            'requests': options['requests'],
+            'max_wait_ms': options['max_wait_ms'],
+            'peak_rss_mb': peak_rss_mb(),
+            'results': results,
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            self.compare(results, baseline, options['threshold'])
+
+    def load_sources(self, options, image_size):
+        """Encoded image bytes when decoding per request, otherwise decoded pixels"""
+        count = max(1, options['num_images'])
+        if options['images_dir']:
+            paths = []
+            for root, _, files in os.walk(options['images_dir']):
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        paths.append(os.path.join(root, name))
+                        if len(paths) >= count:
+                            break
+                if len(paths) >= count:
+                    break
+            if not paths:
+                raise CommandError(f"No images found in {options['images_dir']}")
+            encoded = []
+            for path in paths:
+                with open(path, 'rb') as f:
+                    encoded.append(f.read())
+        else:
+            encoded = [self.synthetic_image(seed) for seed in range(count)]
+
+        if options['include_decode']:
+            return encoded
+        return [decode_pixels(data, image_size) for data in encoded]
+
+    @staticmethod
+    def synthetic_image(seed, size=(1024, 768)):
+        """A random-noise JPEG about the size of a phone photo after client-side downscaling"""
+        rng = np.random.default_rng(seed)
+        pixels = rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+        return buffer.getvalue()
+
+    def run_config(self, model, sources, batch_size, concurrency, options):
+        """Drive one batcher from `concurrency` client threads and time every request"""
+        batcher = PredictionBatcher(model, max_batch_size=batch_size, max_wait_ms=options['max_wait_ms'])
+        include_decode = options['include_decode']
+
+        def run_phase(count, latencies):
+            remaining = iter(range(count))
+            lock = threading.Lock()
+
+            def client():
+                while True:
+                    with lock:
+                        i = next(remaining, None)
+                    if i is None:
+                        return
+                    source = sources[i % len(sources)]
+                    started = time.perf_counter()
+                    pixels = model.preprocess_image(source) if include_decode else source
+                    batcher.predict(pixels, top_k=3)
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for future in [executor.submit(client) for _ in range(concurrency)]:
+                    future.result()
+            return time.perf_counter() - started
+
+        latencies = []
+        try:
+            # Untimed first, so the measured phase starts with running dispatcher threads
+            if options['warmup'] > 0:
+                run_phase(options['warmup'], [])
+            elapsed = run_phase(options['requests'], latencies)
+        finally:
+            batcher.close()
+
+        latencies_ms = np.array(latencies) * 1000
+        return {
+            'batch_size': batch_size,
+            'concurrency': concurrency,
+            'latency_ms': {
+                'p50': round(float(np.percentile(latencies_ms, 50)), 3),
+                'p95': round(float(np.percentile(latencies_ms, 95)), 3),
+                'p99': round(float(np.percentile(latencies_ms, 99)), 3),
+                'mean': round(float(latencies_ms.mean()), 3),
+            },
+            'images_per_sec': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    def compare(self, results, baseline, threshold):
+        """Fail when p95 latency rises or throughput drops by more than `threshold` for any shared configuration"""
+        baseline_results = {config_key(r): r for r in baseline.get('results', [])}
+        regressions = []
+        compared = 0
+
+        for result in results:
+            base = baseline_results.get(config_key(result))
+            if base is None:
+                continue
+            compared += 1
+            label = 'threads={} batch={} concurrency={}'.format(*config_key(result))
+
+            p95, base_p95 = result['latency_ms']['p95'], base['latency_ms']['p95']
+            if base_p95 > 0 and p95 > base_p95 * (1 + threshold):
+                regressions.append(f'{label}: p95 {base_p95}ms -> {p95}ms (+{(p95 / base_p95 - 1) * 100:.1f}%)')
+
+            rate, base_rate = result['images_per_sec'], base['images_per_sec']
+            if base_rate > 0 and rate < base_rate * (1 - threshold):
+                regressions.append(
+                    f'{label}: {base_rate} -> {rate} img/s ({(rate / base_rate - 1) * 100:.1f}%)'
+                )
+
+        if not compared:
+            raise CommandError('No configuration in this run matches the baseline')
+
+        if regressions:
+            for line in regressions:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(
+                f'{len(regressions)} regression(s) beyond {threshold * 100:.0f}% against the baseline'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'No regressions beyond {threshold * 100:.0f}% across {compared} configuration(s)'
+        ))
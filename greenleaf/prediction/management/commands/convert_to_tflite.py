@@ -1,9 +1,15 @@
 # prediction/management/commands/convert_to_tflite.py
 import os
+import random
+import numpy as np
 import tensorflow as tf
 import json
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from prediction.image_ops import decode_pixels
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
 
 class Command(BaseCommand):
     help = 'Convert a saved TensorFlow model to TFLite format for mobile use'
@@ -31,6 +37,80 @@ class Command(BaseCommand):
             action='store_true',
             help='Apply optimizations'
         )
+        parser.add_argument(
+            '--int8',
+            action='store_true',
+            help='Full-integer quantization calibrated on --representative_dir'
+        )
+        parser.add_argument(
+            '--representative_dir',
+            type=str,
+            default=None,
+            help='Class-per-subdirectory image folder (e.g. the train_model --train_dir) used for int8 calibration'
+        )
+        parser.add_argument(
+            '--num_calibration_samples',
+            type=int,
+            default=200,
+            help='Number of images sampled across classes for int8 calibration'
+        )
+        parser.add_argument(
+            '--io_type',
+            choices=['uint8', 'int8'],
+            default='uint8',
+            help='Input/output tensor type of the int8 model'
+        )
+        parser.add_argument(
+            '--image_size',
+            type=int,
+            default=None,
+            help='Model input size for calibration images (default: image_size from model_metadata.json)'
+        )
+
+    def _sample_images(self, root, num_samples):
+        """Pick image paths round-robin across class subdirectories so every class is calibrated"""
+        rng = random.Random(0)
+        per_class = []
+        for class_name in sorted(os.listdir(root)):
+            class_dir = os.path.join(root, class_name)
+            if not os.path.isdir(class_dir):
+                continue
+            files = [
+                entry.path for entry in os.scandir(class_dir)
+                if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+            rng.shuffle(files)
+            if files:
+                per_class.append(files)
+
+        samples = []
+        while per_class and len(samples) < num_samples:
+            for files in list(per_class):
+                if len(samples) >= num_samples:
+                    break
+                samples.append(files.pop())
+                if not files:
+                    per_class.remove(files)
+        return samples
+
+    def _representative_dataset(self, paths, image_size):
+        """Yield calibration inputs preprocessed exactly like the serving runtime ([0,1] floats)"""
+        def generator():
+            for path in paths:
+                try:
+                    pixels = decode_pixels(path, image_size)
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f'Skipping {path}: {e}'))
+                    continue
+                yield [np.expand_dims(pixels.astype(np.float32) / 255.0, axis=0)]
+        return generator
+
+    def _metadata_image_size(self, model_dir):
+        metadata_path = os.path.join(model_dir, 'model_metadata.json')
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r') as f:
+                return json.load(f).get('image_size', 224)
+        return 224
 
     def handle(self, *args, **options):
         # Set paths
@@ -42,6 +122,10 @@ class Command(BaseCommand):
         if not os.path.exists(saved_model_dir):
             self.stdout.write(self.style.ERROR(f'Saved model not found at {saved_model_dir}'))
             return
+
+        if options['int8'] and not options['representative_dir']:
+            self.stdout.write(self.style.ERROR('--int8 needs --representative_dir for calibration'))
+            return
         
         self.stdout.write(self.style.SUCCESS('Converting model to TFLite...'))
         
@@ -55,9 +139,26 @@ class Command(BaseCommand):
                 converter.optimizations = [tf.lite.Optimize.DEFAULT]
             
             # Apply quantization if requested
-            if options['quantize']:
+            if options['quantize'] and not options['int8']:
                 self.stdout.write(self.style.SUCCESS('Applying quantization...'))
                 converter.target_spec.supported_types = [tf.float16]
+
+            # Full-integer quantization: weights, activations and the input/output tensors
+            if options['int8']:
+                image_size = options['image_size'] or self._metadata_image_size(model_dir)
+                samples = self._sample_images(options['representative_dir'], options['num_calibration_samples'])
+                if not samples:
+                    self.stdout.write(self.style.ERROR(f"No images found under {options['representative_dir']}"))
+                    return
+                self.stdout.write(self.style.SUCCESS(
+                    f'Applying int8 quantization calibrated on {len(samples)} images...'
+                ))
+                io_type = tf.uint8 if options['io_type'] == 'uint8' else tf.int8
+                converter.optimizations = [tf.lite.Optimize.DEFAULT]
+                converter.representative_dataset = self._representative_dataset(samples, image_size)
+                converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+                converter.inference_input_type = io_type
+                converter.inference_output_type = io_type
             
             # Convert model
             tflite_model = converter.convert()
@@ -82,7 +183,9 @@ class Command(BaseCommand):
                 'model_path': tflite_model_path,
                 'size_mb': round(model_size, 2),
                 'optimized': options['optimize'],
-                'quantized': options['quantize'],
+                'quantized': options['quantize'] or options['int8'],
+                'int8': options['int8'],
+                'io_type': options['io_type'] if options['int8'] else 'float32',
                 'conversion_date': str(tf.timestamp())
             }
             
@@ -0,0 +1,79 @@
+# prediction/management/commands/generate_image_derivatives.py
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from greenleaf.image_derivatives import REGISTERED_FIELDS, generate_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Backfill thumbnail/medium WebP derivatives for stored images (predictions, chat, profiles)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            default=None,
+            help='Only process this model, e.g. prediction.Prediction (repeatable)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Images processed in parallel'
+        )
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Regenerate derivatives that already exist'
+        )
+
+    def handle(self, *args, **options):
+        targets = REGISTERED_FIELDS
+        if options['model']:
+            wanted = {label.lower() for label in options['model']}
+            targets = [(model, field) for model, field in targets if model._meta.label_lower in wanted]
+            if not targets:
+                labels = ', '.join(model._meta.label for model, _ in REGISTERED_FIELDS)
+                raise CommandError(f'No image fields registered for {options["model"]}; choose from {labels}')
+
+        workers = max(1, options['workers'])
+        for model, field_name in targets:
+            self.backfill(model, field_name, workers, options['overwrite'])
+
+    def backfill(self, model, field_name, workers, overwrite):
+        """Stream file names from the database and keep a bounded number of images in flight"""
+        field = model._meta.get_field(field_name)
+        names = (
+            model.objects.exclude(**{field_name: ''})
+            .exclude(**{f'{field_name}__isnull': True})
+            .order_by('pk')
+            .values_list(field_name, flat=True)
+            .iterator(chunk_size=500)
+        )
+
+        processed = written = failed = 0
+        in_flight = deque()
+
+        def collect(name, future):
+            nonlocal processed, written, failed
+            processed += 1
+            try:
+                written += future.result()
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'{name}: {e}'))
+            if processed % 500 == 0:
+                self.stdout.write(f'{model._meta.label}: {processed} images processed')
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for name in names:
+                in_flight.append((name, executor.submit(generate_derivatives, name, field.storage, overwrite)))
+                if len(in_flight) >= workers * 2:
+                    collect(*in_flight.popleft())
+            while in_flight:
+                collect(*in_flight.popleft())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{model._meta.label}.{field_name}: {processed} images, {written} derivatives written, {failed} failed'
+        ))
@@ -0,0 +1,57 @@
+# prediction/management/commands/publish_model_release.py
+import os
+from django.core.management.base import BaseCommand, CommandError
+from prediction.ml_utils import MODEL_PATH, METADATA_PATH
+from prediction.model_releases import release_manifest
+
+class Command(BaseCommand):
+    help = 'Publish the current model as a release for mobile clients and build patches from earlier releases'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            type=str,
+            default=MODEL_PATH,
+            help='TFLite model to publish (default: the served model)'
+        )
+        parser.add_argument(
+            '--metadata',
+            type=str,
+            default=METADATA_PATH,
+            help='Metadata JSON published with the model'
+        )
+        parser.add_argument(
+            '--release',
+            type=str,
+            help='Release name (default: model_version from the metadata, or the hash prefix)'
+        )
+        parser.add_argument(
+            '--direct',
+            type=int,
+            default=3,
+            help='Build patches from this many most recent releases, so clients several releases behind '
+                 'can update with one patch'
+        )
+
+    def handle(self, *args, **options):
+        model_path = options['model']
+        if not os.path.exists(model_path):
+            raise CommandError(f'Model file not found at {model_path}')
+
+        previous = release_manifest.latest
+        entry, patches = release_manifest.publish(
+            model_path, options['metadata'], version=options['release'], direct=max(1, options['direct'])
+        )
+        if previous is not None and previous['sha256'] == entry['sha256']:
+            self.stdout.write(self.style.WARNING(f"{entry['version']} ({entry['sha256'][:12]}) is already the latest release"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {entry['version']} ({entry['sha256'][:12]}, {entry['size'] / (1024 * 1024):.2f} MB)"
+        ))
+        for patch in patches:
+            source = release_manifest.release(patch['from'])
+            self.stdout.write(
+                f"  patch from {source['version'] if source else patch['from'][:12]}: "
+                f"{patch['size'] / 1024:.1f} KB ({patch['size'] / entry['size']:.1%} of the full model)"
+            )
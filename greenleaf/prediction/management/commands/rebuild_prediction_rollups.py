@@ -0,0 +1,15 @@
+# prediction/management/commands/rebuild_prediction_rollups.py
+import time
+from django.core.management.base import BaseCommand
+from prediction import rollups
+
+class Command(BaseCommand):
+    help = 'Recompute the per-disease prediction totals and daily counts from the Prediction table'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        diseases, days = rollups.rebuild()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt prediction rollups: {diseases} diseases, {days} daily counts in {elapsed:.2f}s'
+        ))
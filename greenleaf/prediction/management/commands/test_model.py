@@ -1,44 +1,209 @@
 # prediction/management/commands/test_model.py
 import os
 import argparse
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from prediction.ml_utils import plant_disease_model
 
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def iter_dataset(dataset_dir, max_per_class=None):
+    """Yield (class_name, path) for a class-per-subdirectory tree without listing it up front"""
+    class_names = sorted(
+        entry.name for entry in os.scandir(dataset_dir) if entry.is_dir()
+    )
+    for class_name in class_names:
+        count = 0
+        with os.scandir(os.path.join(dataset_dir, class_name)) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield class_name, entry.path
+                    count += 1
+                    if max_per_class and count >= max_per_class:
+                        break
+
+
 class Command(BaseCommand):
-    help = 'Test the plant disease detection model with a sample image'
+    help = 'Test the plant disease detection model with a sample image or a class-per-subdirectory dataset'
 
     def add_arguments(self, parser):
         parser.add_argument(
             'image_path',
             type=str,
-            help='Path to the test image'
+            help='Path to the test image, or to a dataset directory with one subdirectory per class'
         )
         parser.add_argument(
             '--top_k',
             type=int,
             default=3,
-            help='Number of top predictions to show'
+            help='Number of top predictions to show (datasets also report top-k accuracy)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Decode threads when evaluating a dataset'
+        )
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=32,
+            help='Images per interpreter invoke when evaluating a dataset'
+        )
+        parser.add_argument(
+            '--max_per_class',
+            type=int,
+            default=None,
+            help='Evaluate at most this many images per class'
         )
 
     def handle(self, *args, **options):
         image_path = options['image_path']
         top_k = options['top_k']
-        
+
         if not os.path.exists(image_path):
             self.stdout.write(self.style.ERROR(f'Image not found at {image_path}'))
             return
-        
+
+        if os.path.isdir(image_path):
+            self.evaluate_dataset(image_path, options)
+            return
+
         self.stdout.write(self.style.SUCCESS(f'Testing model with image: {image_path}'))
-        
+
         # Get top predictions
         predictions = plant_disease_model.get_top_predictions(image_path, top_k=top_k)
-        
+
         # Print results
         self.stdout.write(self.style.SUCCESS('Predictions:'))
         for i, (disease_name, confidence) in enumerate(predictions):
             self.stdout.write(f"{i+1}. {disease_name}: {confidence*100:.2f}%")
-        
+
         # If no predictions were made
         if not predictions:
-            self.stdout.write(self.style.ERROR('No predictions were made. Check if the model is loaded correctly.'))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR('No predictions were made. Check if the model is loaded correctly.'))
+
+    def evaluate_dataset(self, dataset_dir, options):
+        """
+        Stream the dataset through parallel decode and batched inference. Only a bounded
+        window of decoded images is held at a time, so memory doesn't grow with the dataset.
+        """
+        if not plant_disease_model.ensure_loaded():
+            self.stdout.write(self.style.ERROR('Model could not be loaded. Check MODEL_DIR.'))
+            return
+
+        top_k = max(1, options['top_k'])
+        batch_size = max(1, options['batch_size'])
+        workers = max(1, options['workers'])
+        # Enough decodes in flight to fill the next batch while the current one is in invoke()
+        window = batch_size + workers * 2
+
+        self.stdout.write(self.style.SUCCESS(f'Evaluating model on dataset: {dataset_dir}'))
+
+        totals = Counter()
+        top1_correct = Counter()
+        topk_correct = Counter()
+        confusion = defaultdict(Counter)  # true class -> predicted class -> count
+        unreadable = 0
+        evaluated = 0
+
+        def score(batch):
+            nonlocal evaluated
+            labels = [label for label, _ in batch]
+            results = plant_disease_model.get_top_predictions_batch(
+                [pixels for _, pixels in batch], top_k=top_k
+            )
+            for label, predictions in zip(labels, results):
+                names = [name for name, _ in predictions]
+                totals[label] += 1
+                confusion[label][names[0]] += 1
+                if names[0] == label:
+                    top1_correct[label] += 1
+                if label in names:
+                    topk_correct[label] += 1
+            evaluated += len(batch)
+
+        started = time.perf_counter()
+        batch = []
+        in_flight = deque()
+        files = iter_dataset(dataset_dir, options['max_per_class'])
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                while len(in_flight) < window:
+                    item = next(files, None)
+                    if item is None:
+                        break
+                    label, path = item
+                    in_flight.append((label, executor.submit(plant_disease_model.preprocess_image, path)))
+                if not in_flight:
+                    break
+
+                label, future = in_flight.popleft()
+                pixels = future.result()
+                if pixels is None:
+                    unreadable += 1
+                    continue
+                batch.append((label, pixels))
+                if len(batch) >= batch_size:
+                    score(batch)
+                    batch = []
+
+            if batch:
+                score(batch)
+
+        elapsed = time.perf_counter() - started
+
+        if not evaluated:
+            self.stdout.write(self.style.ERROR('No images were evaluated. Expected one subdirectory of images per class.'))
+            return
+
+        self.print_report(totals, top1_correct, topk_correct, confusion, top_k)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Top-1 accuracy: {sum(top1_correct.values()) / evaluated * 100:.2f}% '
+            f'({sum(top1_correct.values())}/{evaluated})'
+        ))
+        if top_k > 1:
+            self.stdout.write(self.style.SUCCESS(
+                f'Top-{top_k} accuracy: {sum(topk_correct.values()) / evaluated * 100:.2f}%'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Evaluated {evaluated} images in {elapsed:.1f}s ({evaluated / elapsed:.1f} images/sec)'
+        ))
+        if unreadable:
+            self.stdout.write(self.style.WARNING(f'Skipped {unreadable} unreadable images'))
+
+        model_classes = set(plant_disease_model.classes.values())
+        unknown = sorted(label for label in totals if label not in model_classes)
+        if unknown:
+            self.stdout.write(self.style.WARNING(
+                f"Subdirectories not in the model's class mapping: {', '.join(unknown)}"
+            ))
+
+    def print_report(self, totals, top1_correct, topk_correct, confusion, top_k):
+        """Per-class accuracy, then the confusion matrix with rows as true and columns as predicted classes"""
+        predicted = {name for row in confusion.values() for name in row}
+        labels = sorted(set(totals) | predicted)
+        width = max(len(label) for label in labels)
+
+        self.stdout.write(self.style.SUCCESS('Per-class accuracy:'))
+        for label in sorted(totals):
+            line = f'{label:<{width}}  {top1_correct[label] / totals[label] * 100:6.2f}%'
+            if top_k > 1:
+                line += f'  top-{top_k} {topk_correct[label] / totals[label] * 100:6.2f}%'
+            self.stdout.write(f'{line}  (n={totals[label]})')
+
+        # Columns are numbered to keep the table readable with long class names
+        self.stdout.write(self.style.SUCCESS('Confusion matrix (rows: true class, columns: predicted):'))
+        cell = max(4, len(str(max(max(row.values()) for row in confusion.values()))) + 1)
+        header = ' ' * (width + 6) + ''.join(f'{i:>{cell}}' for i in range(len(labels)))
+        self.stdout.write(header)
+        for i, label in enumerate(labels):
+            row = confusion.get(label, {})
+            counts = ''.join(f'{row.get(other, 0):>{cell}}' for other in labels)
+            self.stdout.write(f'{i:>3}  {label:<{width}} {counts}')
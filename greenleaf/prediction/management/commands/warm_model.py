@@ -0,0 +1,40 @@
+# prediction/management/commands/warm_model.py
+import time
+from django.core.management.base import BaseCommand, CommandError
+from prediction.ml_utils import plant_disease_model
+
+class Command(BaseCommand):
+    help = 'Load the plant disease model and run a warm-up inference (e.g. as a container readiness step)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no_inference',
+            action='store_true',
+            help='Only load the model, skip the warm-up inference'
+        )
+
+    def handle(self, *args, **options):
+        # Fail with a non-zero exit status, so a readiness step catches a broken model
+        if not plant_disease_model.ensure_loaded():
+            raise CommandError('Model could not be loaded. Check MODEL_DIR.')
+
+        stats = plant_disease_model.pool_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Model loaded in {plant_disease_model.load_seconds}s "
+            f"({stats['size']} interpreters, runtime: {stats['runtime']})"
+        ))
+
+        if options['no_inference']:
+            return
+
+        # The first invoke on each interpreter is noticeably slower than the rest
+        started = time.monotonic()
+        try:
+            warmed = plant_disease_model.warm_up()
+        except Exception as e:
+            raise CommandError(f'Warm-up inference failed: {e}')
+        if not warmed:
+            raise CommandError('Model was unloaded before the warm-up inference')
+        elapsed = (time.monotonic() - started) * 1000
+
+        self.stdout.write(self.style.SUCCESS(f'Warm-up inference done in {elapsed:.1f} ms'))
@@ -0,0 +1,113 @@
+# prediction/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from sub-millisecond invokes to multi-second uploads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus data model, kept in process memory.
+
+    observe() is a bisect plus a few additions under a lock, cheap enough to leave on
+    for every request.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def _labels(self, labelvalues, extra=None):
+        pairs = list(zip(self.labelnames, labelvalues))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+    def render(self):
+        """Prometheus text exposition lines for this histogram"""
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labelvalues, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self._labels(labelvalues, ("le", repr(float(bound))))} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{self._labels(labelvalues, ("le", "+Inf"))} {cumulative}')
+            lines.append(f'{self.name}_sum{self._labels(labelvalues)} {series[-1]}')
+            lines.append(f'{self.name}_count{self._labels(labelvalues)} {cumulative}')
+        return lines
+
+
+stage_seconds = Histogram(
+    'greenleaf_prediction_stage_seconds',
+    'Time spent in each stage of a prediction request.',
+    labelnames=('stage',),
+)
+batch_size = Histogram(
+    'greenleaf_prediction_batch_size',
+    'Images per interpreter invoke.',
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+REGISTRY = [stage_seconds, batch_size]
+
+
+def render_value(name, documentation, value, metric_type='gauge'):
+    """Exposition lines for a single unlabelled counter or gauge"""
+    return [f'# HELP {name} {documentation}', f'# TYPE {name} {metric_type}', f'{name} {value}']
+
+
+def render_metrics(extra_lines=()):
+    """All prediction metrics in Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
+
+
+class StageTimer:
+    """
+    Times the stages of one request. Every stage feeds the shared histogram and is kept
+    so the view can report it in a Server-Timing header.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    def record(self, stage, seconds):
+        stage_seconds.observe(seconds, stage)
+        self.stages.append((stage, seconds))
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def server_timing(self):
+        """Server-Timing header value, durations in milliseconds"""
+        return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.stages)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:35
+
+import greenleaf.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0004_prediction_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='prediction',
+            name='image',
+            field=models.ImageField(storage=greenleaf.storage.ContentAddressedStorage(), upload_to='prediction_images/'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """Count the predictions that already exist"""
+    Prediction = apps.get_model('prediction', 'Prediction')
+    DiseasePredictionTotal = apps.get_model('prediction', 'DiseasePredictionTotal')
+    DailyDiseasePredictionCount = apps.get_model('prediction', 'DailyDiseasePredictionCount')
+
+    daily = (
+        Prediction.objects.annotate(day=TruncDate('created_at'))
+        .values('plant_disease_id', 'day').annotate(count=Count('id')).order_by()
+    )
+    DailyDiseasePredictionCount.objects.bulk_create(
+        [DailyDiseasePredictionCount(plant_disease_id=row['plant_disease_id'], day=row['day'], count=row['count'])
+         for row in daily],
+        batch_size=1000,
+    )
+    totals = Prediction.objects.values('plant_disease_id').annotate(count=Count('id')).order_by()
+    DiseasePredictionTotal.objects.bulk_create(
+        [DiseasePredictionTotal(plant_disease_id=row['plant_disease_id'], count=row['count']) for row in totals]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0006_prediction_user_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiseasePredictionTotal',
+            fields=[
+                ('plant_disease', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='prediction_total', serialize=False, to='prediction.plantdisease')),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyDiseasePredictionCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('plant_disease', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_prediction_counts', to='prediction.plantdisease')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='daily_disease_count_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('plant_disease', 'day'), name='unique_daily_disease_count')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
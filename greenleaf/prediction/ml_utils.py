@@ -1,168 +1,567 @@
 # prediction/ml_utils.py
 import os
+import hashlib
+import queue
+import threading
+import time
+from contextlib import contextmanager
 import numpy as np
-from PIL import Image
-import tensorflow as tf
 import json
 from django.conf import settings
+from django.utils import timezone
+
+from .image_ops import decode_pixels, resize_pixels
+from .metrics import stage_seconds, batch_size as batch_size_histogram
 
 # Path to the saved model
 MODEL_PATH = os.path.join(settings.MODEL_DIR, 'plant_disease_model.tflite')
 METADATA_PATH = os.path.join(settings.MODEL_DIR, 'model_metadata.json')
 
+_interpreter_class = None
+
+
+def get_interpreter_class():
+    """
+    Return a TFLite Interpreter class, preferring a standalone runtime package.
+
+    ai-edge-litert / tflite-runtime are a few MB and import in milliseconds; full
+    TensorFlow is only imported when neither is installed.
+    """
+    global _interpreter_class
+    if _interpreter_class is None:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+        _interpreter_class = Interpreter
+    return _interpreter_class
+
+
+def file_identity(*paths):
+    """(mtime, size) of each file, None for missing ones; changes whenever a file is replaced"""
+    identity = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            identity.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            identity.append(None)
+    return tuple(identity)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PredictionError(Exception):
+    """Raised by batch inference when the model isn't loaded or invoke() fails"""
+
+
+class InterpreterSlot:
+    """One pooled interpreter with its own tensors; only used by one caller at a time"""
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+        self.input_index = self.input_details[0]['index']
+        self.output_index = self.output_details[0]['index']
+        self.pixel_lut = self._build_pixel_lut(self.input_details[0])
+        self.output_scale, self.output_zero_point = self.output_details[0]['quantization']
+
+    @staticmethod
+    def _build_pixel_lut(input_detail):
+        """
+        Lookup table from uint8 pixel values to model input values, so normalization
+        needs no temporary arrays. Models are trained on [0,1] (MobileNetV2); for
+        int8/uint8 models those values are quantized with the input's scale/zero-point.
+        """
+        dtype = np.dtype(input_detail['dtype'])
+        normalized = np.arange(256, dtype=np.float64) / 255.0
+        scale, zero_point = input_detail['quantization']
+
+        if np.issubdtype(dtype, np.integer) and scale:
+            info = np.iinfo(dtype)
+            quantized = np.round(normalized / scale + zero_point)
+            return np.clip(quantized, info.min, info.max).astype(dtype)
+        return normalized.astype(dtype)
+
+    def _dequantize(self, output_data):
+        """Convert int8/uint8 model outputs back to float scores; float outputs pass through"""
+        if self.output_scale and np.issubdtype(output_data.dtype, np.integer):
+            return (output_data.astype(np.float32) - self.output_zero_point) * self.output_scale
+        return output_data
+
+    @staticmethod
+    def batch_bucket(batch_size):
+        """Round a batch size up to the next power of two to limit tensor reallocations"""
+        bucket = 1
+        while bucket < batch_size:
+            bucket *= 2
+        return bucket
+
+    def _resize(self, batch_size):
+        """Resize the input tensor's batch dimension; this re-allocates every tensor"""
+        shape = list(self.input_details[0]['shape'])
+        if shape[0] == batch_size:
+            return
+        shape[0] = batch_size
+        self.interpreter.resize_tensor_input(self.input_index, shape)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+
+    def invoke(self, pixel_batch):
+        """Write a list of (size, size, 3) uint8 images into the input tensor, invoke, and return their scores"""
+        batch_size = len(pixel_batch)
+        self._resize(self.batch_bucket(batch_size))
+
+        # Normalize straight into the interpreter's own input buffer instead of building
+        # a float32 batch and copying it in with set_tensor(). Padding rows keep stale data,
+        # their scores are discarded below.
+        input_tensor = self.interpreter.tensor(self.input_index)()
+        for i, pixels in enumerate(pixel_batch):
+            np.take(self.pixel_lut, pixels, out=input_tensor[i], mode='clip')
+        # The interpreter refuses to run while numpy views into its buffers are alive
+        del input_tensor
+
+        self.interpreter.invoke()
+        return self._dequantize(self.interpreter.get_tensor(self.output_index)[:batch_size])
+
+
+class InterpreterPool:
+    """
+    Fixed-size pool of interpreters built from the same model file.
+
+    TFLite interpreters are not thread-safe, so each caller checks one out for the
+    duration of set_tensor/invoke/get_tensor and returns it afterwards.
+    """
+
+    def __init__(self, model_path, size=1, num_threads=None):
+        self.size = max(1, int(size))
+        self.num_threads = num_threads
+        self._available = queue.LifoQueue()
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+        interpreter_class = get_interpreter_class()
+        self.runtime = interpreter_class.__module__
+        for _ in range(self.size):
+            interpreter = interpreter_class(model_path=model_path, num_threads=num_threads)
+            self._available.put(InterpreterSlot(interpreter))
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Borrow an interpreter, blocking until one is free"""
+        started = time.monotonic()
+        try:
+            slot = self._available.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No interpreter available after {timeout}s")
+        waited = time.monotonic() - started
+        stage_seconds.observe(waited, 'interpreter_wait')
+
+        with self._stats_lock:
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+        try:
+            yield slot
+        finally:
+            self._available.put(slot)
+
+    def warm_up(self, pixels):
+        """Run one inference on every interpreter so real requests don't pay the first-invoke cost"""
+        slots = [self._available.get() for _ in range(self.size)]
+        try:
+            for slot in slots:
+                slot.invoke([pixels])
+        finally:
+            for slot in slots:
+                self._available.put(slot)
+
+    def stats(self):
+        """Pool size and checkout wait times, for ModelInfoView"""
+        with self._stats_lock:
+            checkouts = self._checkouts
+            total_wait = self._total_wait
+            max_wait = self._max_wait
+        return {
+            'runtime': self.runtime,
+            'size': self.size,
+            'num_threads': self.num_threads,
+            'available': self._available.qsize(),
+            'checkouts': checkouts,
+            'avg_wait_ms': round(total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+            'max_wait_ms': round(max_wait * 1000, 3),
+        }
+
+
+class ModelVersion:
+    """
+    One loaded model: its interpreter pool, class map and metadata.
+
+    Never mutated after loading. A reload builds a new ModelVersion and swaps the
+    reference, so requests holding the old one finish on the old interpreters.
+    """
+
+    def __init__(self, pool, classes, image_size, metadata, identity, sha256, load_seconds):
+        self.pool = pool
+        self.classes = classes
+        self.image_size = image_size
+        self.metadata = metadata
+        self.identity = identity
+        self.sha256 = sha256
+        self.load_seconds = load_seconds
+        self.loaded_at = timezone.now()
+        with pool.checkout() as slot:
+            self.input_details = slot.input_details
+            self.output_details = slot.output_details
+
+    @property
+    def version(self):
+        return self.metadata.get('model_version') or self.sha256[:12]
+
+    def validate(self):
+        """Return an error message if the model and its metadata don't fit together"""
+        input_shape = list(self.input_details[0]['shape'])
+        if len(input_shape) != 4 or input_shape[1:] != [self.image_size, self.image_size, 3]:
+            return f"Model input shape {input_shape} does not match image size {self.image_size}"
+
+        class_count = int(self.output_details[0]['shape'][-1])
+        if not self.classes:
+            return "No class mapping found"
+        if class_count != len(self.classes):
+            return f"Model has {class_count} outputs but {len(self.classes)} classes are mapped"
+        if 'class_count' in self.metadata and int(self.metadata['class_count']) != class_count:
+            return f"Metadata class_count {self.metadata['class_count']} does not match {class_count} model outputs"
+        return None
+
+    def invoke(self, pixel_batch):
+        """Run inference on a checked-out interpreter and return a copy of the scores"""
+        # Images decoded for a previous version's input size are resized to fit
+        pixel_batch = [resize_pixels(pixels, self.image_size) for pixels in pixel_batch]
+        with self.pool.checkout() as slot:
+            started = time.perf_counter()
+            scores = slot.invoke(pixel_batch)
+            stage_seconds.observe(time.perf_counter() - started, 'invoke')
+        batch_size_histogram.observe(len(pixel_batch))
+        return scores
+
+    def top_k(self, scores, top_k):
+        """Map one row of scores to a list of (disease_name, confidence) tuples"""
+        top_k = min(top_k, scores.shape[0])
+        indices = np.argpartition(scores, -top_k)[-top_k:]
+        indices = indices[np.argsort(scores[indices])[::-1]]
+        return [
+            (self.classes.get(int(idx), f"Unknown_Class_{idx}"), float(scores[idx]))
+            for idx in indices
+        ]
+
+    def info(self):
+        """Version details for ModelInfoView"""
+        return {
+            'version': self.version,
+            'sha256': self.sha256,
+            'loaded_at': self.loaded_at.isoformat(),
+            'load_seconds': self.load_seconds,
+        }
+
+
 class PlantDiseaseModel:
-    def __init__(self):
-        self.interpreter = None
-        self.input_details = None
-        self.output_details = None
-        self.classes = {}
-        self.image_size = 224  # Default size
-        self.load_model()
-        self.load_metadata()
+    """
+    Plant disease classifier. Nothing is loaded at construction time: the interpreter
+    runtime and model are loaded on first use (or explicitly via ensure_loaded(), e.g.
+    from the warm_model command), so importing this module stays cheap for
+    processes that never predict.
+
+    reload() swaps in a new model version without downtime; with
+    PREDICTION_MODEL_WATCH_INTERVAL > 0 a background thread calls it whenever the
+    model or metadata file changes.
+    """
+
+    def __init__(self, model_path=None, metadata_path=None, pool_size=None, num_threads=None,
+                 watch_interval=None):
+        self.model_path = model_path or MODEL_PATH
+        self.metadata_path = metadata_path or METADATA_PATH
+        self.pool_size = pool_size or getattr(settings, 'PREDICTION_INTERPRETER_POOL_SIZE', 1)
+        self.num_threads = num_threads or getattr(settings, 'PREDICTION_INTERPRETER_THREADS', None)
+        if watch_interval is None:
+            watch_interval = getattr(settings, 'PREDICTION_MODEL_WATCH_INTERVAL', 0)
+        self.watch_interval = watch_interval
+        self.active = None
+        self._load_attempted = False
+        self._load_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._failed_identity = None
+        self._watcher = None
+        self._reload_callbacks = []
+
+    def ensure_loaded(self):
+        """Load the model and metadata once; safe to call from many threads"""
+        if self._load_attempted:
+            return self.is_loaded
+        with self._load_lock:
+            if not self._load_attempted:
+                self.reload(force=True)
+                self._load_attempted = True
+                self._start_watcher()
+        return self.is_loaded
+
+    # Attributes of the active version, for callers that predate ModelVersion
+    @property
+    def pool(self):
+        return self.active.pool if self.active else None
+
+    @property
+    def classes(self):
+        return self.active.classes if self.active else {}
+
+    @property
+    def image_size(self):
+        return self.active.image_size if self.active else 224  # Default size
+
+    @property
+    def input_details(self):
+        return self.active.input_details if self.active else None
+
+    @property
+    def output_details(self):
+        return self.active.output_details if self.active else None
+
+    @property
+    def load_seconds(self):
+        return self.active.load_seconds if self.active else None
     
     def load_metadata(self):
-        """Load model metadata from JSON file"""
+        """Load model metadata from JSON file; returns (classes, image_size, metadata)"""
+        classes = {}
+        image_size = 224  # Default size
+        metadata = {}
         try:
-            if os.path.exists(METADATA_PATH):
-                with open(METADATA_PATH, 'r') as f:
+            if os.path.exists(self.metadata_path):
+                with open(self.metadata_path, 'r') as f:
                     metadata = json.load(f)
                     
                     # Update class mapping
                     if 'classes' in metadata:
                         # Classes might be stored as {index: class_name} dictionary
                         if isinstance(metadata['classes'], dict):
-                            self.classes = {int(k): v for k, v in metadata['classes'].items()}
+                            classes = {int(k): v for k, v in metadata['classes'].items()}
                         # Or as a list of class names
                         elif isinstance(metadata['classes'], list):
-                            self.classes = {i: name for i, name in enumerate(metadata['classes'])}
+                            classes = {i: name for i, name in enumerate(metadata['classes'])}
                     
                     # Update image size
                     if 'image_size' in metadata:
-                        self.image_size = metadata['image_size']
+                        image_size = metadata['image_size']
                     
-                    print(f"Loaded metadata: {len(self.classes)} classes, image size: {self.image_size}")
+                    print(f"Loaded metadata: {len(classes)} classes, image size: {image_size}")
             else:
-                print(f"Metadata file not found at {METADATA_PATH}")
+                print(f"Metadata file not found at {self.metadata_path}")
                 # Fall back to default class mapping from class_mapping.txt if it exists
-                mapping_file = os.path.join(settings.MODEL_DIR, 'class_mapping.txt')
+                mapping_file = os.path.join(os.path.dirname(self.metadata_path), 'class_mapping.txt')
                 if os.path.exists(mapping_file):
                     with open(mapping_file, 'r') as f:
                         for line in f:
                             parts = line.strip().split(',', 1)
                             if len(parts) == 2:
-                                self.classes[int(parts[0])] = parts[1]
-                    print(f"Loaded {len(self.classes)} classes from class_mapping.txt")
+                                classes[int(parts[0])] = parts[1]
+                    print(f"Loaded {len(classes)} classes from class_mapping.txt")
         except Exception as e:
             print(f"Error loading metadata: {e}")
+        return classes, image_size, metadata
     
     def load_model(self):
-        """Load the TFLite model"""
+        """Load the TFLite model into a new pool of interpreters"""
         try:
-            if os.path.exists(MODEL_PATH):
-                self.interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
-                self.interpreter.allocate_tensors()
-                self.input_details = self.interpreter.get_input_details()
-                self.output_details = self.interpreter.get_output_details()
-                print(f"Model loaded successfully from {MODEL_PATH}")
-            else:
-                print(f"Model file not found at {MODEL_PATH}")
-                self.interpreter = None
+            if os.path.exists(self.model_path):
+                pool = InterpreterPool(self.model_path, size=self.pool_size, num_threads=self.num_threads)
+                print(f"Model loaded successfully from {self.model_path} ({pool.size} interpreters)")
+                return pool
+            print(f"Model file not found at {self.model_path}")
         except Exception as e:
             print(f"Error loading model: {e}")
-            self.interpreter = None
+        return None
+
+    def reload(self, force=False):
+        """
+        Build, validate and warm a new model version, then swap it in atomically.
+
+        Returns (status, message) where status is 'reloaded', 'unchanged' or 'failed'.
+        On failure the current version keeps serving.
+        """
+        with self._reload_lock:
+            identity = file_identity(self.model_path, self.metadata_path)
+            if not force and self.active is not None and identity == self.active.identity:
+                return 'unchanged', 'Model files unchanged'
+
+            started = time.monotonic()
+            pool = self.load_model()
+            if pool is None:
+                self._failed_identity = identity
+                return 'failed', f'Model could not be loaded from {self.model_path}'
+            classes, image_size, metadata = self.load_metadata()
+
+            try:
+                version = ModelVersion(
+                    pool, classes, image_size, metadata, identity,
+                    sha256=file_sha256(self.model_path),
+                    load_seconds=None,
+                )
+                error = version.validate()
+                if error is None:
+                    pool.warm_up(np.zeros((image_size, image_size, 3), dtype=np.uint8))
+            except Exception as e:
+                error = str(e)
+
+            if error:
+                print(f"Model reload rejected: {error}")
+                self._failed_identity = identity
+                return 'failed', error
+
+            version.load_seconds = round(time.monotonic() - started, 3)
+            # Requests already running keep their reference to the previous version
+            self.active = version
+            self._failed_identity = None
+            print(f"Model version {version.version} active (loaded in {version.load_seconds}s)")
+        for callback in self._reload_callbacks:
+            try:
+                callback(version)
+            except Exception as e:
+                print(f"Model reload callback failed: {e}")
+        return 'reloaded', f'Model version {version.version} loaded'
+
+    def on_reload(self, callback):
+        """Call `callback(version)` every time a new model version becomes active"""
+        self._reload_callbacks.append(callback)
+
+    def _start_watcher(self):
+        """Poll the model files and reload when they change"""
+        if self.watch_interval <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(self.watch_interval)
+                identity = file_identity(self.model_path, self.metadata_path)
+                current = self.active.identity if self.active else None
+                # Don't retry a broken upload until the files change again
+                if identity != current and identity != self._failed_identity:
+                    self.reload()
+
+        self._watcher = threading.Thread(target=watch, name='model-file-watcher', daemon=True)
+        self._watcher.start()
+
+    def warm_up(self):
+        """Load the model if needed and run a blank image through every pooled interpreter"""
+        if not self.ensure_loaded():
+            return False
+        version = self.active
+        version.pool.warm_up(np.zeros((version.image_size, version.image_size, 3), dtype=np.uint8))
+        return True
+
+    @property
+    def is_loaded(self):
+        return self.active is not None
+
+    @property
+    def input_type(self):
+        """'float32', or 'uint8'/'int8' for full-integer quantized models"""
+        if not self.input_details:
+            return None
+        return np.dtype(self.input_details[0]['dtype']).name
+
+    def version_info(self):
+        """Active model version and load time, or None if no model is loaded"""
+        return self.active.info() if self.active else None
+
+    def pool_stats(self):
+        """Interpreter pool size and wait times, or None if the model is not loaded"""
+        return self.pool.stats() if self.pool else None
     
-    def preprocess_image(self, image_path):
-        """Preprocess the image to fit model input"""
+    def preprocess_image(self, image_source, record=None):
+        """Decode and resize an image to the model input size as (size, size, 3) uint8 pixels"""
+        # image_size comes from the model metadata
+        self.ensure_loaded()
         try:
-            img = Image.open(image_path)
-            
-            # Convert to RGB if needed (e.g., if PNG with transparency)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize to the expected input size
-            img = img.resize((self.image_size, self.image_size))
-            
-            # Convert to numpy array and normalize
-            img_array = np.array(img, dtype=np.float32)
-            
-            # Check if we need to normalize to [0,1] or [-1,1] 
-            # (for MobileNetV2 we use [0,1])
-            img_array = img_array / 255.0
-            
-            # Add batch dimension
-            img_array = np.expand_dims(img_array, axis=0)
-            
-            return img_array
+            return decode_pixels(image_source, self.image_size, record=record)
         except Exception as e:
             print(f"Error preprocessing image: {e}")
             return None
-    
-    def predict(self, image_path):
+
+    def predict(self, image_source):
         """Make a prediction on the given image"""
-        if not self.interpreter:
+        if not self.ensure_loaded():
             return "Model not loaded", 0
         
         try:
             # Preprocess image
-            input_data = self.preprocess_image(image_path)
-            if input_data is None:
+            pixels = self.preprocess_image(image_source)
+            if pixels is None:
                 return "Error preprocessing image", 0
             
-            # Set input tensor
-            self.interpreter.set_tensor(self.input_details[0]['index'], input_data)
-            
-            # Run inference
-            self.interpreter.invoke()
-            
-            # Get output tensor
-            output_data = self.interpreter.get_tensor(self.output_details[0]['index'])
+            version = self.active
+            output_data = version.invoke([pixels])
             
             # Get predicted class and confidence
-            pred_class = np.argmax(output_data[0])
+            pred_class = int(np.argmax(output_data[0]))
             confidence = float(output_data[0][pred_class])
             
             # Map class index to disease name
-            disease_name = self.classes.get(pred_class, f"Unknown_Class_{pred_class}")
+            disease_name = version.classes.get(pred_class, f"Unknown_Class_{pred_class}")
             
             return disease_name, confidence
         except Exception as e:
             print(f"Prediction error: {e}")
             return "Error during prediction", 0
 
-    def get_top_predictions(self, image_path, top_k=3):
+    def get_top_predictions(self, image_source, top_k=3):
         """Get top-k predictions for the image"""
-        if not self.interpreter:
+        if not self.ensure_loaded():
             return [("Model not loaded", 0)]
         
         try:
             # Preprocess image
-            input_data = self.preprocess_image(image_path)
-            if input_data is None:
+            pixels = self.preprocess_image(image_source)
+            if pixels is None:
                 return [("Error preprocessing image", 0)]
             
-            # Set input tensor
-            self.interpreter.set_tensor(self.input_details[0]['index'], input_data)
-            
-            # Run inference
-            self.interpreter.invoke()
-            
-            # Get output tensor
-            output_data = self.interpreter.get_tensor(self.output_details[0]['index'])
-            
-            # Get top k predictions
-            indices = np.argsort(output_data[0])[-top_k:][::-1]
-            results = []
-            
-            for idx in indices:
-                confidence = float(output_data[0][idx])
-                disease_name = self.classes.get(idx, f"Unknown_Class_{idx}")
-                results.append((disease_name, confidence))
-            
-            return results
+            version = self.active
+            output_data = version.invoke([pixels])
+            return version.top_k(output_data[0], top_k)
         except Exception as e:
             print(f"Prediction error: {e}")
             return [("Error during prediction", 0)]
 
-# Initialize the model (singleton)
+    def get_top_predictions_batch(self, pixel_batch, top_k=3):
+        """
+        Get top-k predictions for a list of preprocessed images in one invoke. Raises
+        PredictionError instead of returning placeholder results, so failures reach the
+        batcher's futures and are never cached as predictions.
+        """
+        if not self.ensure_loaded():
+            raise PredictionError('Model not loaded')
+
+        try:
+            version = self.active
+            output_data = version.invoke(pixel_batch)
+            return [version.top_k(scores, top_k) for scores in output_data]
+        except Exception as e:
+            print(f"Batch prediction error: {e}")
+            raise PredictionError('Error during prediction') from e
+
+# Model singleton; loads lazily on first use
 plant_disease_model = PlantDiseaseModel()
\ No newline at end of file
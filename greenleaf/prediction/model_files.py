@@ -0,0 +1,83 @@
+# prediction/model_files.py
+import datetime
+import json
+import os
+import threading
+
+from .ml_utils import MODEL_PATH, METADATA_PATH, file_identity, file_sha256, plant_disease_model
+
+
+class ModelArtifact:
+    """
+    The model files as served to clients: content hash, size, modification time and
+    parsed metadata. Computed once per version of the files on disk, so model-info and
+    export-model don't hash or re-read them on every call.
+    """
+
+    def __init__(self, model_path, identity, sha256, metadata, metadata_error):
+        self.model_path = model_path
+        self.identity = identity
+        self.sha256 = sha256
+        self.metadata = metadata  # None when there is no metadata file
+        self.metadata_error = metadata_error
+        (model_mtime_ns, self.size), metadata_stat = identity
+        self.mtime = model_mtime_ns / 1e9
+        # Metadata changes alter the JSON responses too
+        self.last_modified = max(self.mtime, metadata_stat[0] / 1e9 if metadata_stat else 0)
+
+    @property
+    def etag(self):
+        """Strong validator of the tflite file: its SHA-256"""
+        return f'"{self.sha256}"'
+
+    @property
+    def size_mb(self):
+        return round(self.size / (1024 * 1024), 2)
+
+    @property
+    def modified_iso(self):
+        return datetime.datetime.fromtimestamp(self.mtime).isoformat()
+
+
+_current = None
+_lock = threading.Lock()
+
+
+def _read_metadata(metadata_path):
+    if not os.path.exists(metadata_path):
+        return None, None
+    try:
+        with open(metadata_path, 'r') as f:
+            return json.load(f), None
+    except Exception as e:
+        return None, str(e)
+
+
+def current_artifact(model_path=MODEL_PATH, metadata_path=METADATA_PATH):
+    """The ModelArtifact of the files on disk now, or None if there is no model file"""
+    global _current
+    identity = file_identity(model_path, metadata_path)
+    if identity[0] is None:
+        return None
+    artifact = _current
+    if artifact is not None and artifact.identity == identity and artifact.model_path == model_path:
+        return artifact
+
+    with _lock:
+        artifact = _current
+        if artifact is not None and artifact.identity == identity and artifact.model_path == model_path:
+            return artifact
+
+        metadata, metadata_error = _read_metadata(metadata_path)
+        active = plant_disease_model.active
+        if active is not None and active.identity == identity and plant_disease_model.model_path == model_path:
+            # The loaded version was hashed when it was loaded
+            sha256 = active.sha256
+        else:
+            sha256 = file_sha256(model_path)
+
+        # The files may have been replaced while we read them; hash them again next time
+        if file_identity(model_path, metadata_path) != identity:
+            return ModelArtifact(model_path, identity, sha256, metadata, metadata_error)
+        _current = ModelArtifact(model_path, identity, sha256, metadata, metadata_error)
+        return _current
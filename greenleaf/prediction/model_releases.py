@@ -0,0 +1,327 @@
+# prediction/model_releases.py
+"""
+Published model releases and binary patches between them, so phones can update
+their model without downloading the whole tflite file again.
+
+Layout under PREDICTION_MODEL_RELEASES_DIR:
+
+    manifest.json               versions in publish order, and the available patches
+    <sha256>.tflite             every published model, named by content
+    patches/<from>_<to>.patch   patch turning one release into another
+
+Patch format: the 8 bytes b'GLDELTA1' followed by one zlib stream containing a header
+'>Q32s' (target size, target SHA-256) and a sequence of operations that write the
+target front to back:
+
+    b'C' '>QI' offset, length    copy `length` bytes of the source from `offset`
+    b'X' '>QI' offset, length    source bytes at `offset` XOR the `length` bytes that follow
+    b'D' '>I'  length            the `length` bytes that follow, literally
+
+Retrained models keep most of their layout, so blocks either match the previous
+release (possibly moved by inserted or removed bytes), differ in a few bytes (XOR runs
+are mostly zeros and compress well) or are sent as data.
+"""
+import copy
+import datetime
+import hashlib
+import heapq
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+from .ml_utils import file_sha256
+
+MAGIC = b'GLDELTA1'
+BLOCK_SIZE = 4096
+# Bytes searched either side of the expected offset when a block doesn't line up, and
+# how much of the block has to match exactly to be considered
+SEARCH_WINDOW = 64 * 1024
+ANCHOR_SIZE = 32
+HEADER = struct.Struct('>Q32s')
+SPAN = struct.Struct('>QI')
+LENGTH = struct.Struct('>I')
+
+_lock = threading.Lock()
+
+
+def releases_dir():
+    return getattr(settings, 'PREDICTION_MODEL_RELEASES_DIR',
+                   os.path.join(settings.MODEL_DIR, 'releases'))
+
+
+def _block_key(block):
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+def make_patch(source, target, block_size=BLOCK_SIZE, search_window=SEARCH_WINDOW):
+    """Patch (bytes) that turns `source` into `target`"""
+    src = np.frombuffer(source, dtype=np.uint8)
+    tgt = np.frombuffer(target, dtype=np.uint8)
+    # Aligned source blocks, to find blocks that moved anywhere
+    index = {}
+    for offset in range(0, len(source) - block_size + 1, block_size):
+        index.setdefault(_block_key(source[offset:offset + block_size]), offset)
+
+    def similar(offset, length, candidate):
+        """Whether at least half the bytes of the target block match the source at `candidate`"""
+        if candidate < 0 or candidate + length > len(source):
+            return False
+        matching = np.count_nonzero(src[candidate:candidate + length] == tgt[offset:offset + length])
+        return matching * 2 >= length
+
+    ops = []  # [kind, source offset, length, payload chunks]
+    shift = 0  # target offset - source offset of the last match; insertions and deletions move it
+    for offset in range(0, len(target), block_size):
+        block = target[offset:offset + block_size]
+        length = len(block)
+        expected = offset - shift
+        kind, src_offset, payload = 'D', 0, block
+
+        if source[expected:expected + length] == block:
+            kind, src_offset, payload = 'C', expected, None
+        else:
+            moved = index.get(_block_key(block)) if length == block_size else None
+            if moved is not None:
+                kind, src_offset, payload = 'C', moved, None
+            else:
+                candidates = [expected]
+                # Look for the start of the block near where it should be, in case bytes
+                # were inserted or removed since the last match
+                found = source.find(block[:ANCHOR_SIZE], max(0, expected - search_window),
+                                    expected + search_window + ANCHOR_SIZE)
+                if found >= 0 and found != expected:
+                    candidates.append(found)
+                for candidate in candidates:
+                    if similar(offset, length, candidate):
+                        kind, src_offset = 'X', candidate
+                        payload = np.bitwise_xor(src[candidate:candidate + length],
+                                                 tgt[offset:offset + length]).tobytes()
+                        break
+        if kind != 'D':
+            shift = offset - src_offset
+
+        last = ops[-1] if ops else None
+        # Merge runs: contiguous copies/XORs of the source, and consecutive data
+        if last and last[0] == kind and (kind == 'D' or last[1] + last[2] == src_offset):
+            last[2] += length
+            if payload is not None:
+                last[3].append(payload)
+        else:
+            ops.append([kind, src_offset, length, [payload] if payload is not None else []])
+
+    body = io.BytesIO()
+    body.write(HEADER.pack(len(target), hashlib.sha256(target).digest()))
+    for kind, src_offset, length, payload in ops:
+        body.write(kind.encode())
+        if kind == 'D':
+            body.write(LENGTH.pack(length))
+        else:
+            body.write(SPAN.pack(src_offset, length))
+        for chunk in payload:
+            body.write(chunk)
+    return MAGIC + zlib.compress(body.getvalue(), 9)
+
+
+def apply_patch(source, patch):
+    """Rebuild the target of `patch` from `source`; raises ValueError if the result doesn't check out"""
+    if not patch.startswith(MAGIC):
+        raise ValueError('Not a model patch')
+    try:
+        target_size, target_sha, out = _apply_ops(source, zlib.decompress(patch[len(MAGIC):]))
+    except (zlib.error, struct.error) as e:
+        # Truncated or damaged download
+        raise ValueError(f'Corrupt model patch: {e}') from None
+
+    if len(out) != target_size or hashlib.sha256(out).digest() != target_sha:
+        raise ValueError('Patched model does not match the target checksum')
+    return bytes(out)
+
+
+def _apply_ops(source, body):
+    target_size, target_sha = HEADER.unpack_from(body, 0)
+    position = HEADER.size
+    out = bytearray()
+    while position < len(body):
+        kind = body[position:position + 1]
+        position += 1
+        if kind == b'D':
+            (length,) = LENGTH.unpack_from(body, position)
+            position += LENGTH.size
+            out += body[position:position + length]
+            position += length
+        elif kind in (b'C', b'X'):
+            src_offset, length = SPAN.unpack_from(body, position)
+            position += SPAN.size
+            chunk = source[src_offset:src_offset + length]
+            if len(chunk) != length:
+                raise ValueError('Patch does not fit the source model')
+            if kind == b'X':
+                xor = np.frombuffer(body, dtype=np.uint8, count=length, offset=position)
+                chunk = np.bitwise_xor(np.frombuffer(chunk, dtype=np.uint8), xor).tobytes()
+                position += length
+            out += chunk
+        else:
+            raise ValueError(f'Unknown patch operation {kind!r}')
+    return target_size, target_sha, out
+
+
+class ReleaseManifest:
+    """The manifest of one releases directory"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or releases_dir()
+        self.path = os.path.join(self.directory, 'manifest.json')
+        self._cached = None  # (mtime_ns, data)
+
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return {'versions': [], 'patches': []}
+        if self._cached is None or self._cached[0] != mtime:
+            with open(self.path, 'r') as f:
+                self._cached = (mtime, json.load(f))
+        return self._cached[1]
+
+    def _save(self, data):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def latest(self):
+        versions = self.load()['versions']
+        return versions[-1] if versions else None
+
+    def release(self, sha256):
+        for entry in reversed(self.load()['versions']):
+            if entry['sha256'] == sha256:
+                return entry
+        return None
+
+    def release_path(self, sha256):
+        return os.path.join(self.directory, f'{sha256}.tflite')
+
+    def patch(self, from_sha, to_sha):
+        for entry in self.load()['patches']:
+            if entry['from'] == from_sha and entry['to'] == to_sha:
+                return entry
+        return None
+
+    def patch_path(self, entry):
+        return os.path.join(self.directory, entry['file'])
+
+    def publish(self, model_path, metadata_path=None, version=None, direct=1):
+        """
+        Add the model as the newest release and write patches to it from the `direct`
+        most recent earlier releases. Returns (release entry, [patch entries]).
+        """
+        with _lock:
+            data = copy.deepcopy(self.load())
+            sha256 = file_sha256(model_path)
+            if data['versions'] and data['versions'][-1]['sha256'] == sha256:
+                return data['versions'][-1], []
+
+            metadata = {}
+            if metadata_path and os.path.exists(metadata_path):
+                with open(metadata_path, 'r') as f:
+                    metadata = json.load(f)
+
+            os.makedirs(os.path.join(self.directory, 'patches'), exist_ok=True)
+            release_path = self.release_path(sha256)
+            if not os.path.exists(release_path):
+                shutil.copyfile(model_path, release_path + '.tmp')
+                os.replace(release_path + '.tmp', release_path)
+            with open(release_path, 'rb') as f:
+                target = f.read()
+
+            entry = {
+                'version': version or metadata.get('model_version') or sha256[:12],
+                'sha256': sha256,
+                'size': len(target),
+                'published_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'metadata': metadata,
+            }
+
+            sources = []
+            for previous in reversed(data['versions']):
+                if previous['sha256'] != sha256 and previous['sha256'] not in sources:
+                    sources.append(previous['sha256'])
+                if len(sources) >= direct:
+                    break
+
+            new_patches = []
+            for source_sha in sources:
+                if any(p['from'] == source_sha and p['to'] == sha256 for p in data['patches']):
+                    continue
+                with open(self.release_path(source_sha), 'rb') as f:
+                    source = f.read()
+                patch = make_patch(source, target)
+                # Never publish a patch that doesn't rebuild the release exactly
+                apply_patch(source, patch)
+                if len(patch) >= len(target):
+                    continue
+                name = f'patches/{source_sha}_{sha256}.patch'
+                with open(os.path.join(self.directory, name), 'wb') as f:
+                    f.write(patch)
+                new_patches.append({
+                    'from': source_sha,
+                    'to': sha256,
+                    'file': name,
+                    'size': len(patch),
+                    'sha256': hashlib.sha256(patch).hexdigest(),
+                })
+
+            data['versions'].append(entry)
+            data['patches'].extend(new_patches)
+            self._save(data)
+            return entry, new_patches
+
+    def plan(self, from_sha, to_sha=None):
+        """
+        Cheapest chain of patches (fewest bytes) from one release to another, the latest
+        by default. Returns a list of patch entries ([] when already up to date), or
+        None when no chain exists.
+        """
+        data = self.load()
+        if to_sha is None:
+            if not data['versions']:
+                return None
+            to_sha = data['versions'][-1]['sha256']
+        if from_sha == to_sha:
+            return []
+
+        edges = {}
+        for entry in data['patches']:
+            edges.setdefault(entry['from'], []).append(entry)
+
+        # Dijkstra over releases, weighted by patch size
+        best = {from_sha: 0}
+        queue = [(0, 0, from_sha, [])]
+        pushed = 0
+        while queue:
+            cost, _, sha, chain = heapq.heappop(queue)
+            if sha == to_sha:
+                return chain
+            if cost > best.get(sha, float('inf')):
+                continue
+            for entry in edges.get(sha, ()):
+                next_cost = cost + entry['size']
+                if next_cost < best.get(entry['to'], float('inf')):
+                    best[entry['to']] = next_cost
+                    pushed += 1
+                    heapq.heappush(queue, (next_cost, pushed, entry['to'], chain + [entry]))
+        return None
+
+
+release_manifest = ReleaseManifest()
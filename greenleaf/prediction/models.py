@@ -1,6 +1,7 @@
 # prediction/models.py
 from django.db import models
 from django.contrib.auth.models import User
+from greenleaf.storage import content_addressed_storage
 
 class PlantDisease(models.Model):
     name = models.CharField(max_length=255)
@@ -21,10 +22,55 @@ class PlantDisease(models.Model):
 class Prediction(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='predictions')
     plant_disease = models.ForeignKey(PlantDisease, on_delete=models.CASCADE, related_name='predictions')
-    image = models.ImageField(upload_to='prediction_images/')
+    # Stored by content hash, so retried syncs of the same photo share one file
+    image = models.ImageField(upload_to='prediction_images/', storage=content_addressed_storage)
     confidence_score = models.FloatField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_offline = models.BooleanField(default=False)
+    # Client-generated key for offline records, so retried syncs don't store them twice
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_prediction_idempotency_key',
+            ),
+        ]
+        indexes = [
+            # History listing: one user's predictions, newest first
+            models.Index(fields=['user', 'created_at'], name='prediction_user_created_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.plant_disease.name} - {self.created_at}"
\ No newline at end of file
+        return f"{self.user.username} - {self.plant_disease.name} - {self.created_at}"
+
+class DiseasePredictionTotal(models.Model):
+    """Running count of predictions per disease, maintained by prediction.rollups"""
+    plant_disease = models.OneToOneField(PlantDisease, on_delete=models.CASCADE, primary_key=True,
+                                         related_name='prediction_total')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.plant_disease_id}: {self.count}"
+
+
+class DailyDiseasePredictionCount(models.Model):
+    """Predictions per disease per day (by created_at), maintained by prediction.rollups"""
+    plant_disease = models.ForeignKey(PlantDisease, on_delete=models.CASCADE,
+                                      related_name='daily_prediction_counts')
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plant_disease', 'day'], name='unique_daily_disease_count'),
+        ]
+        indexes = [
+            # Time-window queries scan a range of days across all diseases
+            models.Index(fields=['day'], name='daily_disease_count_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.plant_disease_id} {self.day}: {self.count}"
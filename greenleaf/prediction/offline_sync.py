@@ -0,0 +1,253 @@
+# prediction/offline_sync.py
+import base64
+import binascii
+import datetime
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from greenleaf.image_derivatives import schedule_derivatives
+from . import rollups
+from .catalog import disease_catalog
+from .models import PlantDisease, Prediction
+
+PLACEHOLDER_TEXT = "Information not available yet"
+
+
+class _SyncItem:
+    """One offline record on its way through validation, image write and insert"""
+    __slots__ = ('index', 'image_data', 'disease_name', 'confidence', 'created_at',
+                 'idempotency_key', 'image_path', 'prediction')
+
+    def __init__(self, index):
+        self.index = index
+        self.image_path = None
+        self.prediction = None
+
+
+def _parse_item(index, data):
+    """Validate one record; returns a _SyncItem or raises ValueError with the client-facing message"""
+    if not isinstance(data, dict):
+        raise ValueError('Expected an object')
+
+    item = _SyncItem(index)
+    image_data = data.get('image_data')
+    item.disease_name = data.get('disease_name')
+    if not image_data or not item.disease_name:
+        raise ValueError('Missing image data or disease name')
+    if not isinstance(item.disease_name, str):
+        raise ValueError('disease_name must be a string')
+    if not isinstance(image_data, (str, bytes, bytearray)):
+        raise ValueError('image_data must be a Base64 string')
+
+    if isinstance(image_data, str):
+        # JSON clients send Base64, optionally as a data: URL
+        if image_data.startswith('data:'):
+            image_data = image_data.partition(',')[2]
+        try:
+            image_data = base64.b64decode(image_data, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError('image_data is not valid Base64')
+    item.image_data = bytes(image_data)
+
+    try:
+        item.confidence = float(data.get('confidence', 0) or 0)
+    except (TypeError, ValueError):
+        raise ValueError('confidence must be a number')
+
+    timestamp = data.get('timestamp')
+    if timestamp:
+        try:
+            created_at = datetime.datetime.fromisoformat(timestamp)
+        except (TypeError, ValueError):
+            raise ValueError('timestamp must be an ISO 8601 date-time')
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+        item.created_at = created_at
+    else:
+        item.created_at = None
+
+    key = data.get('idempotency_key')
+    item.idempotency_key = str(key)[:64] if key else None
+    return item
+
+
+def _resolve_diseases(names):
+    """Map every disease name (display name or model class name) to a PlantDisease in two queries at most"""
+    by_name = {}
+    for disease in PlantDisease.objects.filter(Q(name__in=names) | Q(class_name__in=names)):
+        by_name.setdefault(disease.class_name, disease)
+        by_name.setdefault(disease.name, disease)
+
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        PlantDisease.objects.bulk_create(
+            [
+                PlantDisease(
+                    name=name, class_name=name,
+                    description=PLACEHOLDER_TEXT, symptoms=PLACEHOLDER_TEXT,
+                    treatment=PLACEHOLDER_TEXT, prevention=PLACEHOLDER_TEXT,
+                )
+                for name in missing
+            ],
+            ignore_conflicts=True,  # another sync may create the same disease concurrently
+        )
+        # bulk_create sends no post_save
+        transaction.on_commit(disease_catalog.invalidate)
+        for disease in PlantDisease.objects.filter(class_name__in=missing):
+            by_name.setdefault(disease.class_name, disease)
+    return by_name
+
+
+def _image_storage():
+    return Prediction._meta.get_field('image').storage
+
+
+def _existing_keys(user, keys):
+    """{idempotency_key: prediction id} for keys this user already synced"""
+    if not keys:
+        return {}
+    return dict(
+        Prediction.objects.filter(user=user, idempotency_key__in=keys).values_list('idempotency_key', 'id')
+    )
+
+
+def _write_image(item):
+    # Content-addressed: a photo that was already stored only gains a reference
+    image_name = f"offline_{uuid.uuid4()}.jpg"
+    item.image_path = _image_storage().save(
+        os.path.join('prediction_images', image_name),
+        ContentFile(item.image_data)
+    )
+    item.image_data = None
+
+
+def _try_write_image(item):
+    try:
+        _write_image(item)
+    except Exception as e:
+        return f'Could not store image: {e}'
+    return None
+
+
+def _insert(user, items, diseases, results):
+    """bulk_create the predictions; retries once without keys a concurrent sync inserted first"""
+    for attempt in range(2):
+        for item in items:
+            item.prediction = Prediction(
+                user=user,
+                plant_disease=diseases[item.disease_name],
+                image=item.image_path,
+                confidence_score=item.confidence,
+                is_offline=True,
+                idempotency_key=item.idempotency_key,
+            )
+        try:
+            with transaction.atomic():
+                Prediction.objects.bulk_create([item.prediction for item in items])
+                # created_at is auto_now_add, so the client's timestamps go in with one UPDATE
+                dated = [item.prediction for item in items if item.created_at]
+                for item in items:
+                    if item.created_at:
+                        item.prediction.created_at = item.created_at
+                if dated:
+                    Prediction.objects.bulk_update(dated, ['created_at'])
+                # bulk_create sends no post_save, so count them here, by their final date
+                rollups.record_created([item.prediction for item in items])
+            return items
+        except IntegrityError:
+            if attempt:
+                raise
+            existing = _existing_keys(user, {item.idempotency_key for item in items if item.idempotency_key})
+            remaining = []
+            for item in items:
+                if item.idempotency_key in existing:
+                    _image_storage().delete(item.image_path)
+                    results[item.index] = {'index': item.index, 'status': 'duplicate',
+                                           'id': existing[item.idempotency_key],
+                                           'idempotency_key': item.idempotency_key}
+                else:
+                    remaining.append(item)
+            items = remaining
+    return items
+
+
+def sync_offline_predictions(user, records):
+    """
+    Store a batch of offline predictions and return per-record results.
+
+    Every disease name is resolved in one query, images are written in parallel, and
+    the predictions are inserted with one bulk_create inside a transaction. Records
+    whose idempotency_key the user already synced are reported as duplicates and not
+    stored again.
+    """
+    results = [None] * len(records)
+    items = []
+    for index, data in enumerate(records):
+        try:
+            items.append(_parse_item(index, data))
+        except ValueError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+
+    # Retries of records that are already stored, or repeated within this payload
+    existing = _existing_keys(user, {item.idempotency_key for item in items if item.idempotency_key})
+    seen_keys = set()
+    new_items = []
+    for item in items:
+        key = item.idempotency_key
+        if key and (key in existing or key in seen_keys):
+            results[item.index] = {'index': item.index, 'status': 'duplicate',
+                                   'id': existing.get(key), 'idempotency_key': key}
+            continue
+        if key:
+            seen_keys.add(key)
+        new_items.append(item)
+
+    if new_items:
+        diseases = _resolve_diseases({item.disease_name for item in new_items})
+
+        workers = getattr(settings, 'PREDICTION_SYNC_WRITE_WORKERS', 4)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            write_errors = list(executor.map(_try_write_image, new_items))
+        written = []
+        for item, error in zip(new_items, write_errors):
+            if error is None:
+                written.append(item)
+            else:
+                results[item.index] = {'index': item.index, 'status': 'error', 'error': error}
+
+        try:
+            created = _insert(user, written, diseases, results)
+        except Exception:
+            # Nothing was inserted, so don't leave the images behind
+            for item in written:
+                _image_storage().delete(item.image_path)
+            raise
+        created_ids = {}
+        for item in created:
+            schedule_derivatives(item.prediction.image)
+            results[item.index] = {'index': item.index, 'status': 'created', 'id': item.prediction.id,
+                                   'idempotency_key': item.idempotency_key}
+            if item.idempotency_key:
+                created_ids[item.idempotency_key] = item.prediction.id
+        # Keys repeated within this payload point at the record stored for their first occurrence
+        for result in results:
+            if result['status'] == 'duplicate' and result['id'] is None:
+                result['id'] = created_ids.get(result['idempotency_key'])
+
+    created_count = sum(1 for r in results if r['status'] == 'created')
+    duplicates = sum(1 for r in results if r['status'] == 'duplicate')
+    errors = [{'index': r['index'], 'error': r['error']} for r in results if r['status'] == 'error']
+    return {
+        'synced': created_count,
+        'duplicates': duplicates,
+        'failed': len(errors),
+        'results': results,
+        'errors': errors,
+    }
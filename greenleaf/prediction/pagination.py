@@ -0,0 +1,15 @@
+# prediction/pagination.py
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class PredictionHistoryPagination(CursorPagination):
+    """
+    Keyset pagination over a user's predictions, newest first. Each page is one range
+    scan of the (user, created_at) index however deep the client has scrolled; follow
+    `next` to continue.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = getattr(settings, 'PREDICTION_HISTORY_PAGE_SIZE', 50)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'PREDICTION_HISTORY_MAX_PAGE_SIZE', 200)
@@ -0,0 +1,177 @@
+# prediction/preprocessing.py
+import atexit
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+from django.conf import settings
+
+from .executors import ExecutorBusy
+from .image_ops import decode_into_shared_memory
+from .ml_utils import plant_disease_model
+
+
+class PreprocessorBusy(ExecutorBusy):
+    """Raised when no shared memory block is released within the slot timeout"""
+
+
+class PixelLease:
+    """
+    Decoded pixels handed to the caller; call release() (or use `with`) once the
+    batcher has copied them into an interpreter.
+    """
+    __slots__ = ('pixels', '_release')
+
+    def __init__(self, pixels, release=None):
+        self.pixels = pixels
+        self._release = release
+
+    def release(self):
+        self.pixels = None
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+    def __enter__(self):
+        return self.pixels
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _SharedSlot:
+    """One (size, size, 3) uint8 shared memory block and the NumPy view onto it"""
+
+    def __init__(self, image_size):
+        self.shm = shared_memory.SharedMemory(create=True, size=image_size * image_size * 3)
+        self.view = np.ndarray((image_size, image_size, 3), dtype=np.uint8, buffer=self.shm.buf)
+
+    def destroy(self):
+        del self.view
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ImagePreprocessor:
+    """
+    Optional process-pool stage for decode + resize.
+
+    PIL holds the GIL for most of a decode, so with `workers` > 0 images are decoded in
+    worker processes straight into pre-allocated shared memory blocks, and the
+    inference side reads them back as zero-copy NumPy views. With `workers` = 0 it
+    falls back to decoding in the calling thread.
+    """
+
+    def __init__(self, model, workers=0, slot_timeout=30):
+        self.model = model
+        self.workers = max(0, int(workers or 0))
+        self.slot_timeout = slot_timeout
+        self._executor = None
+        self._image_size = None
+        self._slots = []
+        self._free = queue.Queue()
+        self._lock = threading.Lock()
+
+    def _ensure_pool(self):
+        """Start worker processes and allocate shared memory on first use"""
+        if self._executor is not None:
+            return
+        with self._lock:
+            if self._executor is not None:
+                return
+            if not self._slots:
+                self.model.ensure_loaded()
+                self._image_size = self.model.image_size
+                # Two blocks per worker: one being decoded into while the other waits for inference
+                for _ in range(self.workers * 2):
+                    slot = _SharedSlot(self._image_size)
+                    self._slots.append(slot)
+                    self._free.put(slot)
+                atexit.register(self.shutdown)
+            # spawn, not fork: forking a process that already runs interpreter threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+
+    @property
+    def capacity(self):
+        """How many leases can be held at once, or None when decoding in-thread"""
+        return self.workers * 2 if self.workers else None
+
+    @staticmethod
+    def _picklable_source(image_source):
+        """Send a path when the upload is already on disk, otherwise the raw bytes"""
+        if isinstance(image_source, (str, bytes)):
+            return image_source
+        if hasattr(image_source, 'temporary_file_path'):
+            return image_source.temporary_file_path()
+        if isinstance(image_source, (bytearray, memoryview)):
+            return bytes(image_source)
+        image_source.seek(0)
+        return image_source.read()
+
+    def load(self, image_source, record=None, timeout=None):
+        """
+        Decode an image and return a PixelLease, or None if it can't be read.
+        `record(stage, seconds)` receives decode/resize timings. Raises PreprocessorBusy
+        if every shared memory block stays leased for `timeout` seconds (default
+        `slot_timeout`).
+        """
+        if not self.workers:
+            pixels = self.model.preprocess_image(image_source, record=record)
+            return PixelLease(pixels) if pixels is not None else None
+
+        self._ensure_pool()
+        try:
+            slot = self._free.get(timeout=self.slot_timeout if timeout is None else timeout)
+        except queue.Empty:
+            raise PreprocessorBusy('No preprocessing buffer was released in time') from None
+        try:
+            future = self._executor.submit(
+                decode_into_shared_memory,
+                self._picklable_source(image_source),
+                slot.shm.name,
+                self._image_size,
+            )
+            timings = future.result()
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM-killed); start a fresh pool on the next call
+            self._free.put(slot)
+            with self._lock:
+                executor, self._executor = self._executor, None
+            if executor is not None:
+                executor.shutdown(wait=False)
+            print(f"Preprocessing worker pool broke, restarting: {e}")
+            return None
+        except Exception as e:
+            self._free.put(slot)
+            print(f"Error preprocessing image: {e}")
+            return None
+
+        if record is not None:
+            for stage, seconds in timings:
+                record(stage, seconds)
+        return PixelLease(slot.view, release=lambda: self._free.put(slot))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            for slot in self._slots:
+                slot.destroy()
+            self._slots = []
+            self._free = queue.Queue()
+
+
+# Shared preprocessing stage; PREDICTION_PREPROCESS_WORKERS = 0 keeps decoding in-thread
+image_preprocessor = ImagePreprocessor(
+    plant_disease_model,
+    workers=getattr(settings, 'PREDICTION_PREPROCESS_WORKERS', 0),
+    slot_timeout=getattr(settings, 'PREDICTION_PREPROCESS_SLOT_TIMEOUT', 30),
+)
@@ -0,0 +1,255 @@
+# prediction/registry.py
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+
+from .batching import PredictionBatcher, prediction_batcher
+from .ml_utils import PlantDiseaseModel, plant_disease_model
+
+logger = logging.getLogger(__name__)
+
+# The model in MODEL_DIR itself; every other name is a directory under the registry
+DEFAULT_MODEL = 'default'
+MODEL_FILENAME = 'plant_disease_model.tflite'
+METADATA_FILENAME = 'model_metadata.json'
+
+
+class ModelStats:
+    """Served and shadow counters for one model, with windows of recent latencies for percentiles"""
+
+    def __init__(self, window=1000):
+        self.served = 0
+        self.shadow_scored = 0
+        self.shadow_agreed = 0
+        self.shadow_topk_overlap = 0.0
+        self._latencies = deque(maxlen=window)
+        self._shadow_latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_served(self, seconds):
+        with self._lock:
+            self.served += 1
+            self._latencies.append(seconds)
+
+    def record_shadow(self, seconds, agreed, topk_overlap):
+        with self._lock:
+            self.shadow_scored += 1
+            self.shadow_agreed += int(agreed)
+            self.shadow_topk_overlap += topk_overlap
+            self._shadow_latencies.append(seconds)
+
+    @staticmethod
+    def _percentiles(latencies):
+        latencies = np.array(latencies) * 1000
+        return {
+            'p50': round(float(np.percentile(latencies, 50)), 3),
+            'p95': round(float(np.percentile(latencies, 95)), 3),
+            'samples': int(latencies.size),
+        }
+
+    def snapshot(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            shadow_latencies = list(self._shadow_latencies)
+            stats = {'served': self.served, 'shadow_scored': self.shadow_scored}
+            if self.shadow_scored:
+                stats['agreement'] = round(self.shadow_agreed / self.shadow_scored, 4)
+                stats['topk_overlap'] = round(self.shadow_topk_overlap / self.shadow_scored, 4)
+        # Served latency includes batching; shadow latency is a single-image invoke
+        if latencies:
+            stats['latency_ms'] = self._percentiles(latencies)
+        if shadow_latencies:
+            stats['shadow_latency_ms'] = self._percentiles(shadow_latencies)
+        return stats
+
+
+class ModelRegistry:
+    """
+    Versioned models under MODEL_DIR/registry/<version>/, each a plant_disease_model.tflite
+    and model_metadata.json pair, alongside the default model in MODEL_DIR.
+
+    `traffic` maps registry versions to the percentage of /predict/ requests they serve;
+    the remainder goes to the default model. Routing hashes the image, so the same photo
+    is always answered by the same model. Versions listed in `shadows` score a copy of
+    every freshly predicted image on a background thread once the request is done, for
+    agreement and latency comparison only; when the shadow queue is full images are
+    dropped rather than slowing requests down.
+    """
+
+    def __init__(self, base_dir, default_model, default_batcher, traffic=None, shadows=(),
+                 max_shadow_queue=64):
+        self.base_dir = base_dir
+        self.traffic = dict(traffic or {})
+        self.shadows = list(shadows)
+        self._models = {DEFAULT_MODEL: (default_model, default_batcher)}
+        self._stats = {}
+        self._routes = None
+        self._lock = threading.Lock()
+        self._shadow_queue = queue.Queue(maxsize=max(1, int(max_shadow_queue)))
+        self._shadow_thread = None
+        self.shadow_dropped = 0
+
+    def versions(self):
+        """Registry versions that have a model file"""
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(
+            entry.name for entry in os.scandir(self.base_dir)
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, MODEL_FILENAME))
+        )
+
+    def _build_routes(self):
+        """Cumulative (upper bound in basis points, version) pairs from the traffic split"""
+        available = set(self.versions())
+        routes = []
+        bound = 0
+        for name, percent in sorted(self.traffic.items()):
+            if name != DEFAULT_MODEL and name not in available:
+                logger.warning("Model registry: no model for '%s' in %s, not routing traffic to it",
+                               name, self.base_dir)
+                continue
+            share = int(round(float(percent) * 100))
+            if share <= 0:
+                continue
+            if bound + share > 10000:
+                logger.warning("Model registry: traffic split exceeds 100%%, capping '%s'", name)
+                share = 10000 - bound
+            bound += share
+            routes.append((bound, name))
+        return routes
+
+    @property
+    def routes(self):
+        if self._routes is None:
+            with self._lock:
+                if self._routes is None:
+                    self._routes = self._build_routes()
+        return self._routes
+
+    def route(self, image_key):
+        """Name of the model that should answer the image with this content hash"""
+        routes = self.routes
+        if not routes:
+            return DEFAULT_MODEL
+
+        bucket = int(image_key[:8], 16) % 10000
+        for bound, name in routes:
+            if bucket < bound:
+                return name
+        return DEFAULT_MODEL
+
+    def get(self, name):
+        """(model, batcher) for a version, created on first use"""
+        entry = self._models.get(name)
+        if entry is not None:
+            return entry
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is None:
+                version_dir = os.path.join(self.base_dir, name)
+                # Registry versions are immutable, so there is nothing to watch
+                model = PlantDiseaseModel(
+                    model_path=os.path.join(version_dir, MODEL_FILENAME),
+                    metadata_path=os.path.join(version_dir, METADATA_FILENAME),
+                    watch_interval=0,
+                )
+                batcher = PredictionBatcher(
+                    model,
+                    max_batch_size=getattr(settings, 'PREDICTION_MAX_BATCH_SIZE', 8),
+                    max_wait_ms=getattr(settings, 'PREDICTION_MAX_BATCH_WAIT_MS', 5),
+                )
+                entry = self._models[name] = (model, batcher)
+        return entry
+
+    def resolve(self, image_key):
+        """(name, model, batcher) serving this image, falling back to the default model"""
+        name = self.route(image_key)
+        model, batcher = self.get(name)
+        if name != DEFAULT_MODEL and not model.ensure_loaded():
+            name = DEFAULT_MODEL
+            model, batcher = self.get(name)
+        return name, model, batcher
+
+    def _stats_for(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(name, ModelStats())
+        return stats
+
+    def record(self, name, seconds):
+        """Inference latency of a request served by `name`"""
+        self._stats_for(name).record_served(seconds)
+
+    def submit_shadow(self, pixels, predictions, served_by=DEFAULT_MODEL):
+        """Queue an image for the shadow models; never blocks the caller"""
+        if not any(name != served_by for name in self.shadows):
+            return
+        self._ensure_shadow_worker()
+        try:
+            self._shadow_queue.put_nowait((pixels, predictions, served_by))
+        except queue.Full:
+            self.shadow_dropped += 1
+
+    def _ensure_shadow_worker(self):
+        if self._shadow_thread is not None:
+            return
+        with self._lock:
+            if self._shadow_thread is None:
+                self._shadow_thread = threading.Thread(
+                    target=self._run_shadows, name='model-shadow', daemon=True
+                )
+                self._shadow_thread.start()
+
+    def _run_shadows(self):
+        while True:
+            pixels, predictions, served_by = self._shadow_queue.get()
+            served = [disease for disease, _ in predictions]
+            for name in self.shadows:
+                if name == served_by:
+                    continue
+                try:
+                    model, _ = self.get(name)
+                    if not model.ensure_loaded():
+                        continue
+                    started = time.perf_counter()
+                    result = model.get_top_predictions_batch([pixels], top_k=len(served))[0]
+                    seconds = time.perf_counter() - started
+                    shadow = [disease for disease, _ in result]
+                    overlap = len(set(shadow) & set(served)) / len(served)
+                    self._stats_for(name).record_shadow(seconds, shadow[0] == served[0], overlap)
+                except Exception:
+                    logger.exception("Shadow prediction with '%s' failed", name)
+
+    def stats(self):
+        """Traffic split, shadow queue and per-model counters for ModelInfoView"""
+        split, previous = {}, 0
+        for bound, name in self.routes:
+            split[name] = (bound - previous) / 100
+            previous = bound
+        split[DEFAULT_MODEL] = round(split.get(DEFAULT_MODEL, 0) + (10000 - previous) / 100, 2)
+
+        return {
+            'versions': self.versions(),
+            'traffic': split,
+            'shadows': self.shadows,
+            'shadow_queue': {'pending': self._shadow_queue.qsize(), 'dropped': self.shadow_dropped},
+            'models': {name: stats.snapshot() for name, stats in sorted(self._stats.items())},
+        }
+
+
+# Routes /predict/ traffic between the default model and registry versions
+model_registry = ModelRegistry(
+    getattr(settings, 'PREDICTION_MODEL_REGISTRY_DIR', os.path.join(settings.MODEL_DIR, 'registry')),
+    plant_disease_model,
+    prediction_batcher,
+    traffic=getattr(settings, 'PREDICTION_MODEL_TRAFFIC', {}),
+    shadows=getattr(settings, 'PREDICTION_SHADOW_MODELS', []),
+    max_shadow_queue=getattr(settings, 'PREDICTION_SHADOW_QUEUE_SIZE', 64),
+)
@@ -0,0 +1,113 @@
+# prediction/rollups.py
+"""
+Per-disease prediction counts kept up to date as predictions are written, so the
+"common" and "trending" disease lists read a handful of rollup rows instead of
+counting the whole Prediction table.
+
+Single saves and deletes are tracked through signals; bulk writes (offline sync)
+call record_created() themselves. rebuild() recomputes everything from the
+Prediction table, e.g. after raw SQL or queryset.update() changes.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest, TruncDate
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+
+from .models import DailyDiseasePredictionCount, DiseasePredictionTotal, Prediction
+
+
+def _day(created_at):
+    return timezone.localdate(created_at) if timezone.is_aware(created_at) else created_at.date()
+
+
+def _bump(model, lookup, delta):
+    """Add `delta` to the `count` of the row matching `lookup`, creating it if needed"""
+    updated = model.objects.filter(**lookup).update(count=Greatest(F('count') + delta, 0))
+    if updated or delta <= 0:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Created concurrently since the update above
+        model.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def apply(deltas):
+    """Apply {(plant_disease_id, day): change} to the totals and daily counts"""
+    totals = Counter()
+    for (disease_id, _), delta in deltas.items():
+        totals[disease_id] += delta
+    with transaction.atomic():
+        for disease_id, delta in totals.items():
+            if delta:
+                _bump(DiseasePredictionTotal, {'plant_disease_id': disease_id}, delta)
+        for (disease_id, day), delta in deltas.items():
+            if delta:
+                _bump(DailyDiseasePredictionCount, {'plant_disease_id': disease_id, 'day': day}, delta)
+
+
+def record_created(predictions, sign=1):
+    """Count saved predictions (or uncount them with sign=-1) in one pass per disease and day"""
+    deltas = Counter()
+    for prediction in predictions:
+        deltas[(prediction.plant_disease_id, _day(prediction.created_at))] += sign
+    if deltas:
+        apply(deltas)
+
+
+def rebuild():
+    """Recompute every rollup from the Prediction table; returns (diseases, daily rows)"""
+    with transaction.atomic():
+        DailyDiseasePredictionCount.objects.all().delete()
+        DiseasePredictionTotal.objects.all().delete()
+
+        daily = (
+            Prediction.objects.annotate(day=TruncDate('created_at'))
+            .values('plant_disease_id', 'day')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        DailyDiseasePredictionCount.objects.bulk_create(
+            (DailyDiseasePredictionCount(plant_disease_id=row['plant_disease_id'], day=row['day'],
+                                         count=row['count']) for row in daily.iterator()),
+            batch_size=1000,
+        )
+        totals = Prediction.objects.values('plant_disease_id').annotate(count=Count('id')).order_by()
+        total_rows = DiseasePredictionTotal.objects.bulk_create(
+            [DiseasePredictionTotal(plant_disease_id=row['plant_disease_id'], count=row['count'])
+             for row in totals]
+        )
+    return len(total_rows), DailyDiseasePredictionCount.objects.count()
+
+
+def connect():
+    """Keep the rollups in step with single Prediction saves and deletes"""
+
+    def before_save(sender, instance, raw=False, **kwargs):
+        # Remember what an existing row counted for, in case the save moves it
+        instance._rollup_key = None
+        if not raw and instance.pk is not None:
+            old = Prediction.objects.filter(pk=instance.pk).values('plant_disease_id', 'created_at').first()
+            if old is not None:
+                instance._rollup_key = (old['plant_disease_id'], _day(old['created_at']))
+
+    def after_save(sender, instance, created, raw=False, **kwargs):
+        if raw:
+            return
+        key = (instance.plant_disease_id, _day(instance.created_at))
+        old_key = getattr(instance, '_rollup_key', None)
+        if created or old_key is None:
+            apply({key: 1})
+        elif old_key != key:
+            apply({old_key: -1, key: 1})
+
+    def after_delete(sender, instance, **kwargs):
+        record_created([instance], sign=-1)
+
+    pre_save.connect(before_save, sender=Prediction, weak=False, dispatch_uid='rollups_prediction_pre_save')
+    post_save.connect(after_save, sender=Prediction, weak=False, dispatch_uid='rollups_prediction_save')
+    post_delete.connect(after_delete, sender=Prediction, weak=False, dispatch_uid='rollups_prediction_delete')
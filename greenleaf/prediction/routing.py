@@ -0,0 +1,8 @@
+# prediction/routing.py
+
+from django.urls import re_path
+from . import consumers
+
+websocket_urlpatterns = [
+    re_path(r'^ws/predict/$', consumers.PredictionConsumer.as_asgi()),
+]
@@ -1,5 +1,6 @@
 # prediction/serializers.py
 from rest_framework import serializers
+from greenleaf.image_derivatives import DerivativeURLField
 from .models import PlantDisease, Prediction
 
 class PlantDiseaseSerializer(serializers.ModelSerializer):
@@ -7,12 +8,34 @@ class PlantDiseaseSerializer(serializers.ModelSerializer):
         model = PlantDisease
         fields = '__all__'
 
+class PlantDiseaseCountSerializer(PlantDiseaseSerializer):
+    """A disease with how often it was predicted (overall or within a time window)"""
+    prediction_count = serializers.IntegerField(read_only=True)
+
+class PlantDiseaseSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PlantDisease
+        fields = ('id', 'name')
+
 class PredictionSerializer(serializers.ModelSerializer):
     plant_disease = PlantDiseaseSerializer(read_only=True)
     plant_disease_id = serializers.IntegerField(write_only=True, required=False)
+    image_thumbnail = DerivativeURLField('thumbnail', source='image')
+    image_medium = DerivativeURLField('medium', source='image')
     
     class Meta:
         model = Prediction
-        fields = ('id', 'user', 'plant_disease', 'plant_disease_id', 'image', 
-                  'confidence_score', 'created_at', 'is_offline')
-        read_only_fields = ('user', 'confidence_score')
\ No newline at end of file
+        fields = ('id', 'user', 'plant_disease', 'plant_disease_id', 'image', 'image_thumbnail',
+                  'image_medium', 'confidence_score', 'created_at', 'is_offline')
+        read_only_fields = ('user', 'confidence_score')
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sparse fieldset, e.g. ?fields=id,plant_disease,created_at
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class PredictionCompactSerializer(PredictionSerializer):
+    """History rows without the disease text: the disease is just {id, name}"""
+    plant_disease = PlantDiseaseSummarySerializer(read_only=True)
@@ -1,3 +1,504 @@
-from django.test import TestCase
+import base64
+import datetime
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from greenleaf.storage import ContentAddressedStorage, is_cas_name
+
+from . import offline_sync
+from .batching import PredictionBatcher
+from .cache import PredictionCache
+from .consumers import PredictionConsumer
+from .ml_utils import PredictionError
+from .model_releases import BLOCK_SIZE, ReleaseManifest, apply_patch, make_patch
+from .models import DailyDiseasePredictionCount, DiseasePredictionTotal, PlantDisease, Prediction
+from .offline_sync import sync_offline_predictions
+
+
+def _random_bytes(size, seed):
+    return random.Random(seed).randbytes(size)
+
+
+class ModelPatchTests(SimpleTestCase):
+    def setUp(self):
+        self.source = _random_bytes(64 * BLOCK_SIZE, seed=1)
+
+    def assertRoundTrip(self, target):
+        patch = make_patch(self.source, target)
+        self.assertEqual(apply_patch(self.source, patch), target)
+        return patch
+
+    def test_identical(self):
+        patch = self.assertRoundTrip(self.source)
+        self.assertLess(len(patch), 1024)
+
+    def test_insert(self):
+        target = self.source[:10000] + _random_bytes(300, seed=2) + self.source[10000:]
+        patch = self.assertRoundTrip(target)
+        # Everything after the insertion is copied from the source
+        self.assertLess(len(patch), 4 * BLOCK_SIZE)
+
+    def test_delete(self):
+        target = self.source[:30000] + self.source[30500:]
+        patch = self.assertRoundTrip(target)
+        self.assertLess(len(patch), 4 * BLOCK_SIZE)
+
+    def test_move(self):
+        first, second = 8 * BLOCK_SIZE, 40 * BLOCK_SIZE
+        blocks = [self.source[first:first + BLOCK_SIZE], self.source[second:second + BLOCK_SIZE]]
+        target = (self.source[:first] + blocks[1] + self.source[first + BLOCK_SIZE:second]
+                  + blocks[0] + self.source[second + BLOCK_SIZE:])
+        patch = self.assertRoundTrip(target)
+        self.assertLess(len(patch), 2 * BLOCK_SIZE)
+
+    def test_modify(self):
+        target = bytearray(self.source)
+        for offset in range(0, len(target), 997):
+            target[offset] ^= 0xFF
+        patch = self.assertRoundTrip(bytes(target))
+        # Few changed bytes per block: XOR runs, not data
+        self.assertLess(len(patch), len(target) // 4)
+
+    def test_combined_and_unaligned(self):
+        target = bytearray(self.source[:5000] + self.source[9000:200000] + _random_bytes(777, seed=3))
+        target[1234] ^= 1
+        self.assertRoundTrip(bytes(target))
+        self.assertRoundTrip(b'')
+
+    def test_truncated_patch_is_rejected(self):
+        patch = make_patch(self.source, self.source[:100000] + b'new' + self.source[100000:])
+        for cut in (len(patch) - 1, len(patch) // 2, 12):
+            with self.assertRaises(ValueError):
+                apply_patch(self.source, patch[:cut])
+
+    def test_patch_for_another_source_is_rejected(self):
+        target = self.source[:50000] + self.source[50010:]
+        patch = make_patch(self.source, target)
+        other = _random_bytes(len(self.source), seed=4)
+        with self.assertRaises(ValueError):
+            apply_patch(other, patch)
+        with self.assertRaises(ValueError):
+            apply_patch(self.source[:1000], patch)
+
+    def test_not_a_patch(self):
+        with self.assertRaises(ValueError):
+            apply_patch(self.source, b'PK\x03\x04' + self.source[:100])
+
+
+class ReleasePlanTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.manifest = ReleaseManifest(self.directory)
+
+    def write_manifest(self, versions, patches):
+        data = {
+            'versions': [{'version': sha, 'sha256': sha} for sha in versions],
+            'patches': [
+                {'from': source, 'to': target, 'size': size, 'file': f'patches/{source}_{target}.patch'}
+                for source, target, size in patches
+            ],
+        }
+        with open(os.path.join(self.directory, 'manifest.json'), 'w') as f:
+            json.dump(data, f)
+
+    def test_cheapest_chain(self):
+        self.write_manifest(['a', 'b', 'c'], [('a', 'b', 100), ('b', 'c', 100), ('a', 'c', 500)])
+        chain = self.manifest.plan('a')
+        self.assertEqual([(p['from'], p['to']) for p in chain], [('a', 'b'), ('b', 'c')])
+
+    def test_direct_patch_when_cheaper(self):
+        self.write_manifest(['a', 'b', 'c'], [('a', 'b', 300), ('b', 'c', 300), ('a', 'c', 500)])
+        chain = self.manifest.plan('a')
+        self.assertEqual([(p['from'], p['to']) for p in chain], [('a', 'c')])
+
+    def test_up_to_date(self):
+        self.write_manifest(['a', 'b'], [('a', 'b', 100)])
+        self.assertEqual(self.manifest.plan('b'), [])
+
+    def test_no_chain(self):
+        self.write_manifest(['a', 'b', 'c'], [('a', 'b', 100)])
+        self.assertIsNone(self.manifest.plan('a', 'c'))
+        self.assertIsNone(self.manifest.plan('unknown'))
+
+    def test_no_releases(self):
+        self.assertIsNone(self.manifest.plan('a'))
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_same_content_is_stored_once_and_counted(self):
+        first = self.storage.save('prediction_images/leaf.JPG', ContentFile(b'same photo'))
+        second = self.storage.save('uploads/other.jpg', ContentFile(b'same photo'))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith('cas/') and first.endswith('.jpg'))
+        self.assertEqual(self.storage.references(first), 2)
+
+        self.storage.delete(first)
+        self.assertTrue(self.storage.exists(first))
+        self.assertEqual(self.storage.references(first), 1)
+        with self.storage.open(first) as f:
+            self.assertEqual(f.read(), b'same photo')
+
+        self.storage.delete(first)
+        self.assertFalse(self.storage.exists(first))
+        self.assertEqual(self.storage.references(first), 0)
+
+    def test_different_content(self):
+        first = self.storage.save('a.jpg', ContentFile(b'one'))
+        second = self.storage.save('a.jpg', ContentFile(b'two'))
+        self.assertNotEqual(first, second)
+        self.storage.delete(first)
+        self.assertFalse(self.storage.exists(first))
+        self.assertTrue(self.storage.exists(second))
+
+    def test_retain(self):
+        name = self.storage.save('a.jpg', ContentFile(b'shared'))
+        self.assertTrue(self.storage.retain(name))
+        self.assertEqual(self.storage.references(name), 2)
+        self.storage.delete(name)
+        self.storage.delete(name)
+        self.assertFalse(self.storage.retain(name))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_traversal_names_are_not_reference_counted(self):
+        # A file stored before content addressing
+        os.makedirs(self.storage.path('prediction_images'))
+        with open(self.storage.path('prediction_images/legacy.jpg'), 'wb') as f:
+            f.write(b'legacy')
+        name = self.storage.save('a.jpg', ContentFile(b'shared'))
+
+        for sneaky in ('cas/../prediction_images/legacy.jpg', f'{name}/../../../../prediction_images/legacy.jpg',
+                       'cas/ab/cd/../../../prediction_images/legacy.jpg', f'./{name}', 'cas/ab/cd/abcd.jpg'):
+            self.assertFalse(is_cas_name(sneaky), sneaky)
+            self.assertFalse(self.storage.retain(sneaky))
+            self.storage.delete(sneaky)
+        self.assertTrue(self.storage.exists('prediction_images/legacy.jpg'))
+        self.assertTrue(is_cas_name(name))
+        self.assertEqual(self.storage.references(name), 1)
+
+    def test_odd_extensions_stay_content_addressed(self):
+        name = self.storage.save('photo.j p/g', ContentFile(b'odd'))
+        self.assertTrue(is_cas_name(name))
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+
+
+class PredictionConsumerTests(SimpleTestCase):
+    def receive_text(self, text):
+        consumer = PredictionConsumer()
+        consumer.top_k = 3
+        sent = []
+
+        async def send_json(content):
+            sent.append(content)
+        consumer.send_json = send_json
+        async_to_sync(consumer.receive)(text_data=text)
+        return sent
+
+    def test_config(self):
+        self.assertEqual(self.receive_text('{"type": "config", "top_k": 5}'), [{'type': 'config', 'top_k': 5}])
+
+    def test_text_that_is_not_a_json_object(self):
+        for text in ('not json', '[1, 2]', '"config"', '42', 'null'):
+            self.assertEqual(self.receive_text(text),
+                             [{'type': 'error', 'error': 'Expected binary image frames or JSON'}], text)
+
+
+class FakeModel:
+    """Stands in for PlantDiseaseModel: records batch sizes, can fail or take a while"""
+    pool_size = 1
+
+    def __init__(self, failures=0, delay=0, gate=None):
+        self.failures = failures
+        self.delay = delay
+        self.gate = gate
+        self.batches = []
+        self.active = SimpleNamespace(identity=('fake', 1))
+
+    def ensure_loaded(self):
+        return True
+
+    def get_top_predictions_batch(self, pixel_batch, top_k=3):
+        self.batches.append(len(pixel_batch))
+        time.sleep(self.delay)
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.failures:
+            self.failures -= 1
+            raise PredictionError('Error during prediction')
+        return [[('Tomato___healthy', 0.9), ('Tomato___Early_blight', 0.1)][:top_k] for _ in pixel_batch]
+
+
+class PredictionBatcherTests(SimpleTestCase):
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_lone_request_does_not_wait(self):
+        model = FakeModel()
+        batcher = PredictionBatcher(model, max_batch_size=8, max_wait_ms=2000, workers=1)
+        self.addCleanup(batcher.close)
+
+        started = time.monotonic()
+        self.assertEqual(batcher.predict(b'pixels', top_k=1, timeout=5), [('Tomato___healthy', 0.9)])
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(model.batches, [1])
+
+    def test_requests_queued_while_slots_are_busy_are_batched(self):
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        model = FakeModel(gate=gate)
+        # Two dispatchers sharing one slot: the second one collects while the first is in invoke()
+        with mock.patch('prediction.batching.os.cpu_count', return_value=1):
+            batcher = PredictionBatcher(model, max_batch_size=4, max_wait_ms=5000, workers=2)
+            first = batcher.submit(b'first')
+        self.addCleanup(batcher.close)
+        self.wait_for(lambda: model.batches == [1])
+
+        queued = [batcher.submit(b'queued') for _ in range(2)]
+        time.sleep(0.05)
+        self.assertEqual(model.batches, [1])
+        queued += [batcher.submit(b'queued') for _ in range(3)]
+        # Held open for stragglers, then sent once full without waiting out max_wait_ms
+        self.wait_for(lambda: model.batches == [1, 4])
+        gate.set()
+        for future in [first] + queued:
+            self.assertEqual(future.result(timeout=5)[0], ('Tomato___healthy', 0.9))
+        self.assertEqual(model.batches, [1, 4, 1])
+
+
+class PredictionCacheTests(SimpleTestCase):
+    def test_concurrent_lookups_compute_once(self):
+        cache = PredictionCache(FakeModel())
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return [('Tomato___healthy', 0.9)]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('img', 3, compute)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()['coalesced'] < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [[('Tomato___healthy', 0.9)]] * 4)
+        self.assertEqual(cache.get_or_compute('img', 3, compute), [('Tomato___healthy', 0.9)])
+        self.assertEqual(len(calls), 1)
+
+    def test_failures_are_not_cached(self):
+        model = FakeModel(failures=1)
+        cache = PredictionCache(model)
+        batcher = PredictionBatcher(model, max_batch_size=4, max_wait_ms=0)
+        self.addCleanup(batcher.close)
+
+        def compute():
+            return batcher.predict(b'pixels', top_k=2)
+
+        with self.assertRaises(PredictionError):
+            cache.get_or_compute('img', 2, compute)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+        self.assertEqual(cache.get_or_compute('img', 2, compute)[0], ('Tomato___healthy', 0.9))
+        self.assertEqual(model.batches, [1, 1])
+        cache.get_or_compute('img', 2, compute)
+        self.assertEqual(model.batches, [1, 1])
+
+
+def _photo(seed):
+    return base64.b64encode(_random_bytes(256, seed)).decode()
+
+
+def _stored_name(data):
+    return ContentAddressedStorage.content_name(hashlib.sha256(base64.b64decode(data)).hexdigest(), 'x.jpg')
+
+
+class OfflineSyncTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.storage = Prediction._meta.get_field('image').storage
+        self.user = User.objects.create_user('grower', password='secret')
+        PlantDisease.objects.create(name='Tomato healthy', class_name='Tomato___healthy', description='-',
+                                    symptoms='-', treatment='-', prevention='-')
+
+    def record(self, key, seed):
+        return {'image_data': _photo(seed), 'disease_name': 'Tomato___healthy', 'confidence': 0.9,
+                'idempotency_key': key}
+
+    def test_replayed_key_is_a_duplicate(self):
+        record = self.record('k1', seed=1)
+        first = sync_offline_predictions(self.user, [record])
+        self.assertEqual((first['synced'], first['duplicates']), (1, 0))
+        prediction_id = first['results'][0]['id']
+
+        replay = sync_offline_predictions(self.user, [record])
+        self.assertEqual((replay['synced'], replay['duplicates'], replay['failed']), (0, 1, 0))
+        self.assertEqual(replay['results'], [{'index': 0, 'status': 'duplicate', 'id': prediction_id,
+                                              'idempotency_key': 'k1'}])
+        self.assertEqual(Prediction.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(self.storage.references(_stored_name(record['image_data'])), 1)
+
+    def test_key_repeated_within_a_batch(self):
+        records = [self.record('k1', seed=1), self.record('k1', seed=2)]
+        result = sync_offline_predictions(self.user, records)
+        self.assertEqual((result['synced'], result['duplicates']), (1, 1))
+        created, duplicate = result['results']
+        self.assertEqual(created['status'], 'created')
+        self.assertEqual(duplicate, {'index': 1, 'status': 'duplicate', 'id': created['id'],
+                                     'idempotency_key': 'k1'})
+        self.assertEqual(Prediction.objects.count(), 1)
+        # The repeat's photo is never written
+        self.assertFalse(self.storage.exists(_stored_name(records[1]['image_data'])))
+
+    def test_key_inserted_by_a_concurrent_sync(self):
+        records = [self.record('k1', seed=1), self.record('k2', seed=2)]
+        # Another sync stores k1 after this one checked for existing keys, so the insert
+        # conflicts and is retried without it
+        other = sync_offline_predictions(self.user, [self.record('k1', seed=3)])
+        real_existing_keys = offline_sync._existing_keys
+        with mock.patch.object(offline_sync, '_existing_keys',
+                               side_effect=[{}, real_existing_keys(self.user, {'k1', 'k2'})]):
+            result = sync_offline_predictions(self.user, records)
+
+        self.assertEqual((result['synced'], result['duplicates'], result['failed']), (1, 1, 0))
+        self.assertEqual(result['results'][0], {'index': 0, 'status': 'duplicate',
+                                                'id': other['results'][0]['id'], 'idempotency_key': 'k1'})
+        self.assertEqual(result['results'][1]['status'], 'created')
+        self.assertEqual(Prediction.objects.count(), 2)
+        self.assertFalse(self.storage.exists(_stored_name(records[0]['image_data'])))
+        self.assertEqual(self.storage.references(_stored_name(records[1]['image_data'])), 1)
+
+    def test_images_are_released_when_the_insert_fails(self):
+        records = [self.record('k1', seed=1), self.record(None, seed=2)]
+        with mock.patch.object(offline_sync.rollups, 'record_created', side_effect=DatabaseError('gone')):
+            with self.assertRaises(DatabaseError):
+                sync_offline_predictions(self.user, records)
+
+        self.assertEqual(Prediction.objects.count(), 0)
+        for record in records:
+            name = _stored_name(record['image_data'])
+            self.assertFalse(self.storage.exists(name))
+            self.assertEqual(self.storage.references(name), 0)
+
+
+class PredictionRollupTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('grower', password='secret')
+        self.blight, self.healthy = (
+            PlantDisease.objects.create(name=name, class_name=name, description='-', symptoms='-',
+                                        treatment='-', prevention='-')
+            for name in ('Tomato___Early_blight', 'Tomato___healthy')
+        )
+
+    def predict(self, disease):
+        return Prediction.objects.create(user=self.user, plant_disease=disease, confidence_score=0.8,
+                                         image='prediction_images/leaf.jpg')
+
+    def assertRollupsMatch(self):
+        totals = dict(Prediction.objects.values_list('plant_disease_id').annotate(n=Count('id')).order_by())
+        daily = {
+            (disease_id, day): n for disease_id, day, n in
+            Prediction.objects.annotate(day=TruncDate('created_at'))
+            .values_list('plant_disease_id', 'day').annotate(n=Count('id')).order_by()
+        }
+        self.assertEqual(dict(DiseasePredictionTotal.objects.filter(count__gt=0)
+                              .values_list('plant_disease_id', 'count')), totals)
+        self.assertEqual({(disease_id, day): n for disease_id, day, n in
+                          DailyDiseasePredictionCount.objects.filter(count__gt=0)
+                          .values_list('plant_disease_id', 'day', 'count')}, daily)
+
+    def test_create_update_and_delete(self):
+        first, second, third = self.predict(self.blight), self.predict(self.blight), self.predict(self.healthy)
+        self.assertRollupsMatch()
+        self.assertEqual(DiseasePredictionTotal.objects.get(plant_disease=self.blight).count, 2)
+
+        first.plant_disease = self.healthy
+        first.save()
+        self.assertRollupsMatch()
+
+        second.created_at -= datetime.timedelta(days=3)
+        second.save()
+        self.assertRollupsMatch()
+
+        # A save that changes nothing counted
+        third.confidence_score = 0.5
+        third.save()
+        self.assertRollupsMatch()
+
+        second.delete()
+        first.delete()
+        self.assertRollupsMatch()
+        self.assertEqual(DiseasePredictionTotal.objects.get(plant_disease=self.healthy).count, 1)
+
+    def test_offline_sync_bulk_insert(self):
+        self.predict(self.blight)
+        records = [
+            {'image_data': _photo(seed), 'disease_name': disease, 'confidence': 0.7, 'timestamp': timestamp}
+            for seed, (disease, timestamp) in enumerate([
+                ('Tomato___Early_blight', '2025-04-01T10:00:00+00:00'),
+                ('Tomato___Early_blight', '2025-04-01T11:00:00+00:00'),
+                ('Tomato___healthy', '2025-04-02T09:00:00+00:00'),
+                ('Potato___Late_blight', None),
+            ])
+        ]
+        self.assertEqual(sync_offline_predictions(self.user, records)['synced'], 4)
+        self.assertRollupsMatch()
+        self.assertEqual(DailyDiseasePredictionCount.objects.get(
+            plant_disease=self.blight, day=datetime.date(2025, 4, 1)).count, 2)
+
+    def test_rebuild_command(self):
+        for disease in (self.blight, self.blight, self.healthy):
+            self.predict(disease)
+        # Writes the signals don't see
+        Prediction.objects.filter(plant_disease=self.healthy).update(plant_disease=self.blight)
+        DiseasePredictionTotal.objects.filter(plant_disease=self.healthy).update(count=7)
+
+        out = io.StringIO()
+        call_command('rebuild_prediction_rollups', stdout=out)
+        self.assertIn('Rebuilt prediction rollups: 1 diseases, 1 daily counts', out.getvalue())
+        self.assertRollupsMatch()
+        self.assertFalse(DiseasePredictionTotal.objects.filter(plant_disease=self.healthy).exists())
@@ -1,7 +1,11 @@
 # prediction/urls.py
 from django.urls import path, include
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.routers import DefaultRouter
-from .views import PlantDiseaseViewSet, PredictionViewSet, MakePredictionView, ModelInfoView,ExportModelView
+from .views import (
+    PlantDiseaseViewSet, PredictionViewSet, MakePredictionView, AsyncPredictionView, BatchPredictionView, ModelInfoView, ModelReadyView, ModelReloadView, MetricsView, ExportModelView,
+    ModelReleasesView, ModelDeltaView, ModelReleaseDownloadView, ModelPatchDownloadView,
+)
 
 router = DefaultRouter()
 router.register(r'diseases', PlantDiseaseViewSet)
@@ -10,6 +14,17 @@ router.register(r'predictions', PredictionViewSet, basename='prediction')
 urlpatterns = [
     path('', include(router.urls)),
     path('predict/', MakePredictionView.as_view(), name='predict'),
+    # Token-authenticated like the DRF views, so CSRF doesn't apply
+    path('predict/async/', csrf_exempt(AsyncPredictionView.as_view()), name='predict_async'),
+    path('predict/batch/', BatchPredictionView.as_view(), name='predict_batch'),
     path('model-info/', ModelInfoView.as_view(), name='model_info'),
+    path('model-ready/', ModelReadyView.as_view(), name='model_ready'),
+    path('model-reload/', ModelReloadView.as_view(), name='model_reload'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('export-model/', ExportModelView.as_view(), name='export_model'),
+    path('model-releases/', ModelReleasesView.as_view(), name='model_releases'),
+    path('model-releases/delta/', ModelDeltaView.as_view(), name='model_delta'),
+    path('model-releases/<str:sha256>/download/', ModelReleaseDownloadView.as_view(), name='model_release_download'),
+    path('model-releases/patches/<str:from_sha>/<str:to_sha>/', ModelPatchDownloadView.as_view(),
+         name='model_patch_download'),
 ]
\ No newline at end of file
@@ -1,61 +1,188 @@
 # prediction/views.py
 
 import os
-import uuid
+import asyncio
+import hashlib
 import json
+import zipfile
 import datetime
-import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from asgiref.sync import sync_to_async
 
 from django.conf import settings
-from django.db.models import Count
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-from django.shortcuts import get_object_or_404
-from django.http import FileResponse
+from django.db.models import Sum
+from django.utils import timezone
+from django.http import FileResponse, StreamingHttpResponse, HttpResponse, JsonResponse
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.urls import reverse
+from django.views import View
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
 
 
 
 from rest_framework import status, viewsets, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
-from .models import PlantDisease, Prediction
-from .serializers import PlantDiseaseSerializer, PredictionSerializer
+from .models import PlantDisease, Prediction, DailyDiseasePredictionCount, DiseasePredictionTotal
+from .serializers import (
+    PlantDiseaseSerializer, PlantDiseaseCountSerializer, PredictionSerializer, PredictionCompactSerializer,
+)
+from .pagination import PredictionHistoryPagination
 from .ml_utils import plant_disease_model
+from .batching import prediction_batcher
+from .cache import prediction_cache
+from .catalog import disease_catalog
+from .model_files import current_artifact
+from .model_releases import release_manifest
+from .preprocessing import image_preprocessor
+from .registry import model_registry, DEFAULT_MODEL
+from .offline_sync import sync_offline_predictions
+from .executors import inference_executor, ExecutorBusy
+from authentication.tokens import aget_user_for_request
+from .metrics import StageTimer, render_metrics, render_value
 import traceback
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def build_prediction_payload(predictions, disease_details):
+    """Shape top-k model output the way /predict/ returns it"""
+    disease_name, confidence = predictions[0]
+    return {
+        'disease': disease_name,
+        'confidence': round(confidence * 100, 2),
+        'other_predictions': [
+            {'disease': name, 'confidence': round(conf * 100, 2)}
+            for name, conf in predictions[1:]
+        ],
+        'details': disease_details
+    }
+
+
 class PlantDiseaseViewSet(viewsets.ReadOnlyModelViewSet):
     """Viewset to list and retrieve plant diseases"""
     queryset = PlantDisease.objects.all()
     serializer_class = PlantDiseaseSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @staticmethod
+    def _limit(request, default=10):
+        try:
+            return max(1, min(int(request.query_params.get('limit', default)), 50))
+        except ValueError:
+            return default
+
     @action(detail=False, methods=['get'])
     def common(self, request):
         """Return the most commonly predicted plant diseases"""
-        common_diseases = PlantDisease.objects.annotate(
-            prediction_count=Count('predictions')
-        ).order_by('-prediction_count')[:10]
-
-        serializer = self.get_serializer(common_diseases, many=True)
+        limit = self._limit(request)
+        # Read from the rollup table rather than counting every prediction
+        totals = DiseasePredictionTotal.objects.select_related('plant_disease').order_by('-count')[:limit]
+        common_diseases = []
+        for total in totals:
+            total.plant_disease.prediction_count = total.count
+            common_diseases.append(total.plant_disease)
+
+        if len(common_diseases) < limit:
+            # Diseases never predicted still fill the list, as before
+            for disease in PlantDisease.objects.exclude(
+                pk__in=[disease.pk for disease in common_diseases]
+            )[:limit - len(common_diseases)]:
+                disease.prediction_count = 0
+                common_diseases.append(disease)
+
+        serializer = PlantDiseaseCountSerializer(common_diseases, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Return the most predicted plant diseases of the last `days` days (default 7)"""
+        try:
+            days = int(request.query_params.get('days', 7))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= 366:
+            return Response({'error': 'days must be between 1 and 366'}, status=status.HTTP_400_BAD_REQUEST)
+
+        since = timezone.localdate() - datetime.timedelta(days=days - 1)
+        counts = (
+            DailyDiseasePredictionCount.objects.filter(day__gte=since)
+            .values('plant_disease_id')
+            .annotate(prediction_count=Sum('count'))
+            .filter(prediction_count__gt=0)
+            .order_by('-prediction_count')[:self._limit(request)]
+        )
+        counts = list(counts)
+        diseases = PlantDisease.objects.in_bulk([row['plant_disease_id'] for row in counts])
+        trending = []
+        for row in counts:
+            disease = diseases.get(row['plant_disease_id'])
+            if disease is None:
+                continue
+            disease.prediction_count = row['prediction_count']
+            trending.append(disease)
+
+        serializer = PlantDiseaseCountSerializer(trending, many=True, context=self.get_serializer_context())
+        return Response({'days': days, 'since': since, 'results': serializer.data})
+
 
 class PredictionViewSet(viewsets.ModelViewSet):
-    """Viewset for viewing and creating predictions"""
+    """
+    Viewset for viewing and creating predictions.
+
+    The list is cursor-paginated. `?compact=true` returns the disease as {id, name}
+    instead of its full text, and `?fields=id,plant_disease,...` returns only the
+    named fields.
+    """
     serializer_class = PredictionSerializer
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
+    pagination_class = PredictionHistoryPagination
+
+    def _read_options(self):
+        """(compact, fields) requested by a GET; fields is None unless ?fields= was given"""
+        if self.request.method != 'GET':
+            return False, None
+        params = self.request.query_params
+        compact = params.get('compact', '').lower() in ('1', 'true', 'yes')
+        fields = params.get('fields')
+        if fields:
+            fields = [name.strip() for name in fields.split(',') if name.strip()]
+        return compact, fields or None
 
     def get_queryset(self):
-        return Prediction.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Prediction.objects.filter(user=self.request.user).order_by('-created_at')
+        compact, fields = self._read_options()
+        if fields is not None and 'plant_disease' not in fields:
+            return queryset
+        queryset = queryset.select_related('plant_disease')
+        if compact:
+            # Only the disease id and name are sent, so leave its text columns in the DB
+            queryset = queryset.defer(
+                'plant_disease__description', 'plant_disease__symptoms',
+                'plant_disease__treatment', 'plant_disease__prevention',
+            )
+        return queryset
+
+    def get_serializer_class(self):
+        compact, _ = self._read_options()
+        return PredictionCompactSerializer if compact else PredictionSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        _, fields = self._read_options()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -67,124 +194,361 @@ class PredictionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(recent_predictions, many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, MultiPartParser, FormParser])
     def sync_offline(self, request):
         """
         Sync offline predictions to the server.
-        Expects a list of predictions with image_data (Base64), disease_name, confidence, and timestamp.
+        Expects a list of predictions with image_data (Base64), disease_name, confidence, timestamp
+        and an optional client-generated idempotency_key; records whose key was already synced
+        are reported as duplicates instead of being stored again.
         """
         if not request.data:
             return Response({'error': 'No data provided'}, status=status.HTTP_400_BAD_REQUEST)
 
         offline_predictions = request.data
-        synced_predictions = []
-        errors = []
-
-        for idx, pred_data in enumerate(offline_predictions):
-            try:
-                image_data = pred_data.get('image_data')  # This should be raw binary, not base64
-                disease_name = pred_data.get('disease_name')
-                confidence = pred_data.get('confidence', 0)
-                timestamp = pred_data.get('timestamp')
-
-                if not image_data or not disease_name:
-                    errors.append({'index': idx, 'error': 'Missing image data or disease name'})
-                    continue
-
-                # Find or create plant disease
-                plant_disease, _ = PlantDisease.objects.get_or_create(
-                    name=disease_name,
-                    defaults={
-                        "description": "Information not available yet",
-                        "symptoms": "Information not available yet",
-                        "treatment": "Information not available yet",
-                        "prevention": "Information not available yet"
-                    }
-                )
-
-                # Save image
-                image_name = f"offline_{uuid.uuid4()}.jpg"
-                image_path = default_storage.save(
-                    os.path.join('prediction_images', image_name),
-                    ContentFile(image_data)
-                )
+        if not isinstance(offline_predictions, list):
+            return Response({'error': 'Expected a list of predictions'}, status=status.HTTP_400_BAD_REQUEST)
 
-                # Create prediction
-                prediction = Prediction.objects.create(
-                    user=request.user,
-                    plant_disease=plant_disease,
-                    image=image_path,
-                    confidence_score=confidence,
-                    is_offline=True,
-                    created_at=datetime.datetime.fromisoformat(timestamp) if timestamp else datetime.datetime.now()
-                )
+        max_items = getattr(settings, 'PREDICTION_SYNC_MAX_ITEMS', 500)
+        if len(offline_predictions) > max_items:
+            return Response({'error': f'At most {max_items} predictions per sync'},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-                synced_predictions.append(PredictionSerializer(prediction).data)
-
-            except Exception as e:
-                errors.append({'index': idx, 'error': str(e)})
-
-        return Response({
-            'synced': len(synced_predictions),
-            'failed': len(errors),
-            'predictions': synced_predictions,
-            'errors': errors
-        })
+        return Response(sync_offline_predictions(request.user, offline_predictions))
 
 
 class MakePredictionView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        timer = StageTimer()
+        started = time.perf_counter()
         try:
-            image = request.FILES.get('image')
+            with timer.stage('upload'):
+                image = request.FILES.get('image')
 
             if not image:
                 return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Use a safe temp file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-                temp_file.write(image.read())
-                temp_path = temp_file.name
-
-            # Get predictions
-            predictions = plant_disease_model.get_top_predictions(temp_path, top_k=3)
+            # Resubmitted photos are answered from the cache without touching the model
+            with timer.stage('hash'):
+                image_key = prediction_cache.image_key(image)
+
+            # The traffic split may send this image to a registry version instead
+            model_name, _, batcher = model_registry.resolve(image_key)
+            shadow_pixels = None
+
+            def run_model():
+                nonlocal shadow_pixels
+                # Decode straight from the upload, then let the batcher run inference
+                # together with concurrent requests
+                lease = image_preprocessor.load(image, record=timer.record)
+                if lease is None:
+                    return None
+                with lease as pixels:
+                    inference_started = time.perf_counter()
+                    predictions = batcher.predict(pixels, top_k=3)
+                    inference_seconds = time.perf_counter() - inference_started
+                    timer.record('inference', inference_seconds)
+                    model_registry.record(model_name, inference_seconds)
+                    if model_registry.shadows:
+                        # The lease's buffer is reused once released
+                        shadow_pixels = pixels.copy()
+                return predictions
+
+            cache_key = image_key if model_name == DEFAULT_MODEL else f'{model_name}:{image_key}'
+            predictions = prediction_cache.get_or_compute(cache_key, 3, run_model)
+
+            if predictions is None:
+                return Response({'error': 'Could not read image'}, status=status.HTTP_400_BAD_REQUEST)
 
             if not predictions:
                 return Response({'error': 'No predictions returned from model'},
                                 status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            disease_name, confidence = predictions[0]
-            other_predictions = predictions[1:]
-
-            # Fetch disease details from DB
-            plant_disease = get_object_or_404(PlantDisease, class_name=disease_name)
-
-            disease_details = {
-                'description': plant_disease.description,
-                'symptoms': plant_disease.symptoms,
-                'treatment': plant_disease.treatment,
-                'prevention': plant_disease.prevention,
-            }
-
-            return Response({
-                'disease': disease_name,
-                'confidence': round(confidence * 100, 2),
-                'other_predictions': [
-                    {'disease': name, 'confidence': round(conf * 100, 2)}
-                    for name, conf in other_predictions
-                ],
-                'details': disease_details
-            })
-
+            disease_name, _ = predictions[0]
+
+            # Disease details come from the in-memory catalog, not the DB
+            with timer.stage('db'):
+                details = disease_catalog.get(disease_name)
+            if details is None:
+                return Response({'detail': 'No PlantDisease matches the given query.'},
+                                status=status.HTTP_404_NOT_FOUND)
+
+            response = Response(build_prediction_payload(predictions, details))
+            timer.record('total', time.perf_counter() - started)
+            response['Server-Timing'] = timer.server_timing()
+            response['X-Model-Version'] = model_name
+
+            # Scored on the shadow thread; the response doesn't wait for it
+            if shadow_pixels is not None:
+                model_registry.submit_shadow(shadow_pixels, predictions, served_by=model_name)
+            return response
+
+        except ExecutorBusy:
+            response = Response({'error': 'Too many predictions in progress, try again shortly'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = '1'
+            return response
         except Exception as e:
             logger.error("Prediction failed: %s", traceback.format_exc())
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        finally:
-            # Clean up the temporary image file
-            if 'temp_path' in locals() and os.path.exists(temp_path):
-                os.remove(temp_path)
+
+class AsyncPredictionView(View):
+    """
+    /predict/ as a native async view for ASGI servers (daphne).
+
+    The request never holds an event loop or sync_to_async thread while it works:
+    upload parsing, hashing and decode run on the bounded inference executor,
+    inference runs on the batcher's dispatcher threads and is awaited through its
+    future, and disease details come from the in-memory catalog. Responses match /predict/.
+    """
+
+    @staticmethod
+    def _read_upload(request):
+        """Parse the multipart body and hash the image; runs on the inference executor"""
+        image = request.FILES.get('image')
+        if not image:
+            return None, None, None
+        image_key = prediction_cache.image_key(image)
+        # Loads the model on first use, so that doesn't happen on the event loop either
+        plant_disease_model.ensure_loaded()
+        return image, image_key, model_registry.resolve(image_key)
+
+    async def post(self, request):
+        timer = StageTimer()
+        started = time.perf_counter()
+
+        user = await aget_user_for_request(request)
+        if user is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided or are invalid.'},
+                                status=status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            upload_started = time.perf_counter()
+            image, image_key, resolved = await inference_executor.run(self._read_upload, request)
+            timer.record('upload', time.perf_counter() - upload_started)
+
+            if not image:
+                return JsonResponse({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+            model_name, _, batcher = resolved
+            shadow_pixels = None
+
+            async def run_model():
+                nonlocal shadow_pixels
+                lease = await inference_executor.run(
+                    image_preprocessor.load, image, record=timer.record,
+                    on_abandon=lambda lease: lease.release(),
+                )
+                if lease is None:
+                    return None
+                if model_registry.shadows:
+                    shadow_pixels = lease.pixels.copy()
+
+                inference_started = time.perf_counter()
+                future = batcher.submit(lease.pixels, top_k=3)
+                # Release once the batcher has run, even if this request is cancelled first
+                future.add_done_callback(lambda _: lease.release())
+                predictions = await asyncio.wrap_future(future)
+                inference_seconds = time.perf_counter() - inference_started
+                timer.record('inference', inference_seconds)
+                model_registry.record(model_name, inference_seconds)
+                return predictions
+
+            cache_key = image_key if model_name == DEFAULT_MODEL else f'{model_name}:{image_key}'
+            predictions = await prediction_cache.aget_or_compute(cache_key, 3, run_model)
+        except ExecutorBusy:
+            response = JsonResponse({'error': 'Too many predictions in progress, try again shortly'},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = '1'
+            return response
+        except Exception as e:
+            logger.error("Async prediction failed: %s", traceback.format_exc())
+            return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if predictions is None:
+            return JsonResponse({'error': 'Could not read image'}, status=status.HTTP_400_BAD_REQUEST)
+        if not predictions:
+            return JsonResponse({'error': 'No predictions returned from model'},
+                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        disease_name, _ = predictions[0]
+        db_started = time.perf_counter()
+        details = await disease_catalog.aget(disease_name)
+        if details is None:
+            return JsonResponse({'detail': 'No PlantDisease matches the given query.'},
+                                status=status.HTTP_404_NOT_FOUND)
+        timer.record('db', time.perf_counter() - db_started)
+
+        response = JsonResponse(build_prediction_payload(predictions, details))
+        timer.record('total', time.perf_counter() - started)
+        response['Server-Timing'] = timer.server_timing()
+        response['X-Model-Version'] = model_name
+
+        if shadow_pixels is not None:
+            model_registry.submit_shadow(shadow_pixels, predictions, served_by=model_name)
+        return response
+
+
+async def _async_chunks(chunks):
+    """Fetch each chunk of a blocking iterator in a worker thread"""
+    chunks = iter(chunks)
+    fetch = sync_to_async(next, thread_sensitive=False)
+    done = object()
+    try:
+        while True:
+            chunk = await fetch(chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        # Client went away: run the generator's cleanup too
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=False)()
+
+
+def _is_asgi(request):
+    return getattr(request, 'scope', None) is not None
+
+
+def _streaming_content(request, chunks):
+    """
+    StreamingHttpResponse content for a blocking iterator. Under ASGI Django reads a sync
+    iterator to the end before sending anything, so there it gets an async iterator
+    that fetches one chunk at a time; WSGI servers stream the iterator as it is.
+    """
+    if _is_asgi(request):
+        return _async_chunks(chunks)
+    return chunks
+
+
+class BatchPredictionView(APIView):
+    """
+    Predict many images in one request and stream one NDJSON line per image.
+
+    Images come as repeated `images` multipart parts and/or a zip `archive`. Uploads
+    are spooled to disk, zip members are read one at a time, and only a bounded
+    window of decoded images is in flight, so memory does not grow with the number
+    of images.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        # Spool every part to disk instead of keeping small uploads in memory
+        request._request.upload_handlers = [TemporaryFileUploadHandler(request._request)]
+
+        images = request.FILES.getlist('images')
+        archive = request.FILES.get('archive')
+
+        if not images and not archive:
+            return Response({'error': "Provide 'images' files or an 'archive' zip"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if archive and not zipfile.is_zipfile(archive):
+            return Response({'error': "'archive' is not a zip file"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            top_k = max(1, min(int(request.query_params.get('top_k', 3)), 10))
+        except ValueError:
+            return Response({'error': 'top_k must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            _streaming_content(request, self._stream(images, archive, top_k)),
+            content_type='application/x-ndjson'
+        )
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _iter_sources(self, images, archive):
+        """Yield (filename, image source) pairs, reading zip members lazily"""
+        for image in images:
+            yield image.name, image
+
+        if archive:
+            max_member_bytes = getattr(settings, 'PREDICTION_BATCH_MAX_MEMBER_BYTES', 25 * 1024 * 1024)
+            archive.seek(0)
+            with zipfile.ZipFile(archive) as zf:
+                for info in zf.infolist():
+                    if info.is_dir():
+                        continue
+                    if info.file_size > max_member_bytes:
+                        yield info.filename, None
+                        continue
+                    yield info.filename, zf.read(info)
+
+    def _stream(self, images, archive, top_k):
+        """Decode images while earlier ones are in the batcher, emitting lines as results complete"""
+        window = max(1, getattr(settings, 'PREDICTION_BATCH_WINDOW', 2 * prediction_batcher.max_batch_size))
+        if image_preprocessor.capacity:
+            # Never wait on a pixel buffer that only this stream could release
+            window = min(window, image_preprocessor.capacity)
+        in_flight = deque()
+
+        def result_line(index, filename, future):
+            try:
+                predictions = future.result()
+                disease_name, _ = predictions[0]
+                details = disease_catalog.get(disease_name)
+                if details is None:
+                    line = {'index': index, 'filename': filename, 'error': f'Unknown disease {disease_name}'}
+                else:
+                    line = {'index': index, 'filename': filename,
+                            **build_prediction_payload(predictions, details)}
+            except Exception as e:
+                logger.error("Batch prediction failed: %s", traceback.format_exc())
+                line = {'index': index, 'filename': filename, 'error': str(e)}
+            return json.dumps(line) + '\n'
+
+        def drain(block_until_below):
+            # Emit every finished item; block on the oldest ones until the window has room
+            while in_flight:
+                done, _ = wait([item[2] for item in in_flight], timeout=0)
+                if not done and len(in_flight) < block_until_below:
+                    return
+                if not done:
+                    wait([item[2] for item in in_flight], return_when=FIRST_COMPLETED)
+                    continue
+                for item in [item for item in in_flight if item[2] in done]:
+                    in_flight.remove(item)
+                    yield result_line(*item)
+
+        for index, (filename, source) in enumerate(self._iter_sources(images, archive)):
+            try:
+                lease = image_preprocessor.load(source) if source is not None else None
+            except ExecutorBusy as e:
+                yield json.dumps({'index': index, 'filename': filename, 'error': str(e)}) + '\n'
+                continue
+            if lease is None:
+                yield json.dumps({'index': index, 'filename': filename, 'error': 'Could not read image'}) + '\n'
+                continue
+
+            future = prediction_batcher.submit(lease.pixels, top_k=top_k)
+            # The pixels are copied into the interpreter by the time the future is done, so
+            # the buffer goes back right away, whether or not this stream is still read
+            future.add_done_callback(lambda _, lease=lease: lease.release())
+            in_flight.append((index, filename, future))
+            yield from drain(block_until_below=window)
+
+        yield from drain(block_until_below=1)
+
+
+def _json_etag(data):
+    """Weak validator of a JSON body, for responses built from several sources"""
+    digest = hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _conditional(request, response, etag, last_modified=None):
+    """Answer 304/412 per the request's If-* headers, else return `response` with validators set"""
+    last_modified = int(last_modified) if last_modified is not None else None
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+    conditional['ETag'] = etag
+    if last_modified is not None:
+        conditional['Last-Modified'] = http_date(last_modified)
+    return conditional
 
 
 class ModelInfoView(APIView):
@@ -192,67 +556,321 @@ class ModelInfoView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        model_dir = settings.MODEL_DIR
-        metadata_path = os.path.join(model_dir, 'model_metadata.json')
-        tflite_path = os.path.join(model_dir, 'plant_disease_model.tflite')
-
         model_info = {
-            'status': 'loaded' if plant_disease_model.interpreter else 'not_loaded',
+            'status': 'loaded' if plant_disease_model.is_loaded else 'not_loaded',
             'classes': len(plant_disease_model.classes),
             'image_size': plant_disease_model.image_size,
+            'input_type': plant_disease_model.input_type,
+            'load_seconds': plant_disease_model.load_seconds,
+            'active_version': plant_disease_model.version_info(),
+            'interpreter_pool': plant_disease_model.pool_stats(),
+            'prediction_cache': prediction_cache.stats(),
+            'model_registry': model_registry.stats(),
+            'async_executor': inference_executor.stats(),
+            'disease_catalog': disease_catalog.stats(),
         }
 
-        if os.path.exists(metadata_path):
-            try:
-                with open(metadata_path, 'r') as f:
-                    model_info['metadata'] = json.load(f)
-            except Exception as e:
-                model_info['metadata_error'] = str(e)
+        artifact = current_artifact()
+        if artifact is not None:
+            if artifact.metadata is not None:
+                model_info['metadata'] = artifact.metadata
+            if artifact.metadata_error:
+                model_info['metadata_error'] = artifact.metadata_error
+            model_info['model_size_mb'] = artifact.size_mb
+            model_info['model_last_modified'] = artifact.modified_iso
+
+        # Validated by the model and metadata files and the loaded version only; the live
+        # stats in the body change on every request and would rule out any 304
+        etag = _json_etag({
+            'sha256': artifact.sha256 if artifact else None,
+            'metadata': artifact.identity[1] if artifact else None,
+            'status': model_info['status'],
+            'active_version': model_info['active_version'],
+        })
+        return _conditional(request, Response(model_info), etag, artifact.last_modified if artifact else None)
+
+
+class MetricsView(APIView):
+    """Per-stage prediction latency histograms and cache/pool counters in Prometheus text format"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        extra = []
+        cache_stats = prediction_cache.stats()
+        extra += render_value('greenleaf_prediction_cache_hits_total', 'Prediction cache hits.',
+                              cache_stats['hits'], 'counter')
+        extra += render_value('greenleaf_prediction_cache_misses_total', 'Prediction cache misses.',
+                              cache_stats['misses'], 'counter')
+        extra += render_value('greenleaf_prediction_cache_coalesced_total',
+                              'Requests that waited on an identical in-flight prediction.',
+                              cache_stats['coalesced'], 'counter')
+        extra += render_value('greenleaf_prediction_cache_entries', 'Entries in the prediction cache.',
+                              cache_stats['entries'])
+
+        pool_stats = plant_disease_model.pool_stats()
+        if pool_stats:
+            extra += render_value('greenleaf_interpreter_pool_size', 'Interpreters in the pool.',
+                                  pool_stats['size'])
+            extra += render_value('greenleaf_interpreter_pool_available', 'Idle interpreters.',
+                                  pool_stats['available'])
+
+        return HttpResponse(render_metrics(extra), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class ModelReadyView(APIView):
+    """
+    Readiness probe. The model loads lazily, so the first call starts loading it in the
+    background and returns 503 until the interpreters are ready.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    _warm_lock = threading.Lock()
+    _warm_thread = None
+
+    def get(self, request):
+        if plant_disease_model.is_loaded:
+            return Response({'status': 'ready', 'load_seconds': plant_disease_model.load_seconds})
+
+        with self._warm_lock:
+            cls = type(self)
+            if cls._warm_thread is None or not cls._warm_thread.is_alive():
+                cls._warm_thread = threading.Thread(
+                    target=plant_disease_model.warm_up, name='model-warmup', daemon=True
+                )
+                cls._warm_thread.start()
+
+        return Response({'status': 'loading'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
 
-        if os.path.exists(tflite_path):
-            model_info['model_size_mb'] = round(os.path.getsize(tflite_path) / (1024 * 1024), 2)
-            model_info['model_last_modified'] = datetime.datetime.fromtimestamp(
-                os.path.getmtime(tflite_path)
-            ).isoformat()
+class ModelReloadView(APIView):
+    """
+    Reload the model from MODEL_DIR without restarting workers (admin only).
+
+    The new version is loaded, validated and warmed while the current one keeps
+    serving; it only takes over once it passed. Pass force=true to reload even if the
+    files look unchanged.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        force = str(request.data.get('force', '')).lower() == 'true'
+        result, message = plant_disease_model.reload(force=force)
 
-        return Response(model_info)
+        body = {
+            'result': result,
+            'message': message,
+            'active_version': plant_disease_model.version_info(),
+        }
+        if result == 'failed':
+            return Response(body, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response(body)
+
+
+def _requested_range(request, size, etag, mtime):
+    """(start, end) inclusive for a single satisfiable byte range, 'unsatisfiable', or None for the whole file"""
+    header = request.META.get('HTTP_RANGE', '')
+    if not header.startswith('bytes=') or ',' in header:
+        # Multipart ranges aren't worth it for one file; send all of it
+        return None
+
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(mtime):
+        # The client's partial copy is of another version: start over
+        return None
+
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # bytes=-N: the last N bytes
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+
+def _read_range(path, start, end, chunk_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _file_download(request, path, etag, mtime, filename):
+    """
+    Send a file as an attachment with ETag/Last-Modified; answers conditional requests
+    with 304 and Range requests with 206, so interrupted downloads can resume.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=int(mtime))
+    if response is None:
+        size = os.path.getsize(path)
+        byte_range = _requested_range(request, size, etag, mtime)
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range is not None or _is_asgi(request):
+            # FileResponse would be read whole before sending under ASGI, like any sync iterator
+            start, end = byte_range or (0, size - 1)
+            response = StreamingHttpResponse(
+                _streaming_content(request, _read_range(path, start, end)),
+                status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+                content_type='application/octet-stream',
+            )
+            response['Content-Length'] = str(end - start + 1)
+            if byte_range:
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        else:
+            response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(int(mtime))
+    return response
 
 
 class ExportModelView(APIView):
-    """View to download/export the TFLite model file for mobile use"""
+    """
+    View to download/export the TFLite model file for mobile use.
+
+    Responses carry an ETag (the model's SHA-256 for downloads) and Last-Modified, so
+    clients that already have this version get a 304. Downloads honour Range (with
+    If-Range), so an interrupted download resumes where it stopped.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        model_dir = settings.MODEL_DIR
-        tflite_path = os.path.join(model_dir, 'plant_disease_model.tflite')
-        metadata_path = os.path.join(model_dir, 'model_metadata.json')
-
-        if not os.path.exists(tflite_path):
+        artifact = current_artifact()
+        if artifact is None:
             return Response({'error': 'Model not found'}, status=status.HTTP_404_NOT_FOUND)
 
         if request.query_params.get('download', '').lower() == 'true':
-            return FileResponse(
-                open(tflite_path, 'rb'),
-                as_attachment=True,
-                filename='plant_disease_model.tflite'
-            )
+            return self._download(request, artifact)
 
-        metadata = {}
-        if os.path.exists(metadata_path):
-            try:
-                with open(metadata_path, 'r') as f:
-                    metadata = json.load(f)
-            except Exception as e:
-                metadata = {'error': str(e)}
+        if artifact.metadata_error:
+            metadata = {'error': artifact.metadata_error}
+        else:
+            metadata = artifact.metadata or {}
 
-        model_size = round(os.path.getsize(tflite_path) / (1024 * 1024), 2)
-        last_modified = datetime.datetime.fromtimestamp(
-            os.path.getmtime(tflite_path)
-        ).isoformat()
-
-        return Response({
-            'model_size_mb': model_size,
-            'last_modified': last_modified,
+        response = Response({
+            'model_size_mb': artifact.size_mb,
+            'last_modified': artifact.modified_iso,
+            'sha256': artifact.sha256,
             'metadata': metadata,
             'download_url': request.build_absolute_uri() + '?download=true'
         })
+        etag = _json_etag({'sha256': artifact.sha256, 'metadata': metadata})
+        return _conditional(request, response, etag, artifact.last_modified)
+
+    def _download(self, request, artifact):
+        return _file_download(request, artifact.model_path, artifact.etag, artifact.mtime,
+                              'plant_disease_model.tflite')
+
+
+def _release_summary(request, entry):
+    return {
+        'version': entry['version'],
+        'sha256': entry['sha256'],
+        'size': entry['size'],
+        'published_at': entry['published_at'],
+        'download_url': request.build_absolute_uri(
+            reverse('model_release_download', args=[entry['sha256']])
+        ),
+    }
+
+
+class ModelReleasesView(APIView):
+    """Published model releases, oldest first (see `manage.py publish_model_release`)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        manifest = release_manifest.load()
+        versions = [
+            {**_release_summary(request, entry), 'metadata': entry.get('metadata', {})}
+            for entry in manifest['versions']
+        ]
+        data = {'latest': versions[-1]['sha256'] if versions else None, 'versions': versions}
+        return _conditional(request, Response(data), _json_etag(data))
+
+
+class ModelDeltaView(APIView):
+    """
+    How a client holding model `?from=<sha256>` gets the latest release (or `?to=<sha256>`).
+
+    `status` is `up_to_date`, `patch` (apply `patches` in order, then check the result
+    against `target.sha256`) or `full` (download `target.download_url`) when no patch
+    chain leads to the target or the patches wouldn't be smaller than the model.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        from_sha = request.query_params.get('from', '').strip().lower()
+        to_sha = request.query_params.get('to', '').strip().lower()
+
+        target = release_manifest.release(to_sha) if to_sha else release_manifest.latest
+        if target is None:
+            message = f'Unknown release {to_sha}' if to_sha else 'No model releases published'
+            return Response({'error': message}, status=status.HTTP_404_NOT_FOUND)
+
+        data = {'from': from_sha or None, 'target': _release_summary(request, target)}
+        if from_sha == target['sha256']:
+            return Response({'status': 'up_to_date', **data})
+
+        chain = release_manifest.plan(from_sha, target['sha256']) if from_sha else None
+        patch_bytes = sum(entry['size'] for entry in chain) if chain else 0
+        if not chain or patch_bytes >= target['size']:
+            return Response({'status': 'full', **data})
+
+        return Response({
+            'status': 'patch',
+            **data,
+            'patch_bytes': patch_bytes,
+            'patches': [
+                {
+                    'from': entry['from'],
+                    'to': entry['to'],
+                    'size': entry['size'],
+                    'sha256': entry['sha256'],
+                    'url': request.build_absolute_uri(
+                        reverse('model_patch_download', args=[entry['from'], entry['to']])
+                    ),
+                }
+                for entry in chain
+            ],
+        })
+
+
+class ModelReleaseDownloadView(APIView):
+    """Download one published release; supports conditional and Range requests"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, sha256):
+        entry = release_manifest.release(sha256)
+        path = release_manifest.release_path(sha256) if entry else None
+        if path is None or not os.path.exists(path):
+            return Response({'error': 'Release not found'}, status=status.HTTP_404_NOT_FOUND)
+        return _file_download(request, path, f'"{sha256}"', os.path.getmtime(path),
+                              f"plant_disease_model_{entry['version']}.tflite")
+
+
+class ModelPatchDownloadView(APIView):
+    """Download the patch between two releases; supports conditional and Range requests"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, from_sha, to_sha):
+        entry = release_manifest.patch(from_sha, to_sha)
+        path = release_manifest.patch_path(entry) if entry else None
+        if path is None or not os.path.exists(path):
+            return Response({'error': 'Patch not found'}, status=status.HTTP_404_NOT_FOUND)
+        return _file_download(request, path, f'"{entry["sha256"]}"', os.path.getmtime(path),
+                              f'{from_sha[:12]}_{to_sha[:12]}.patch')